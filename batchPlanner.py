@@ -0,0 +1,82 @@
+import threading
+from collections import deque
+
+
+class BatchPlanner:
+    """
+    Chooses how many devices go into the next activate-devices request.
+    Fast responses grow the size additively; slow ones trim it and failures
+    halve it (AIMD, like AdaptiveRateLimiter). Every batch is also capped so
+    its query string stays under max_url_length.
+
+    Failed batches come back through split(): both halves jump the queue, so
+    one bad ID or an oversized request costs a few small retries instead of
+    200 devices marked missing.
+    """
+
+    def __init__(self, items, base_url_length, size=200, min_size=10, max_size=400,
+                 increase=50, target_latency=2.0, max_url_length=8000, max_failure_streak=10):
+        self.size               = int(size)
+        self.min_size           = int(min_size)
+        self.max_size           = int(max_size)
+        self.increase           = int(increase)
+        self.target_latency     = float(target_latency)
+        self.max_url_length     = int(max_url_length)
+        self.max_failure_streak = int(max_failure_streak)
+        self.base_url_length    = int(base_url_length)
+        self.failure_streak     = 0
+        self.splits             = 0
+        self._queue             = deque(items)
+        self._retry             = deque()     # split halves, served before fresh items
+        self._lock              = threading.Lock()
+
+    def __bool__(self):
+        return bool(self._queue or self._retry)
+
+    def remaining(self):
+        return len(self._queue) + sum(len(b) for b in self._retry)
+
+    def next_batch(self):
+        """The next batch to send: a pending split half, else up to `size` fresh items within the URL cap."""
+        with self._lock:
+            if self._retry:
+                return self._retry.popleft()
+            batch, url_length = [], self.base_url_length
+            while self._queue and len(batch) < self.size:
+                cost = len(self._queue[0]) + 1          # the item plus its comma
+                if batch and url_length + cost > self.max_url_length:
+                    break
+                url_length += cost
+                batch.append(self._queue.popleft())
+            return batch
+
+    def on_success(self, size, latency):
+        with self._lock:
+            self.failure_streak = 0
+            if latency > 2 * self.target_latency:
+                self.size = max(self.min_size, int(self.size * 0.75))
+            elif latency <= self.target_latency and size >= self.size:
+                # Only a batch at the current size proves the current size is fine
+                self.size = min(self.max_size, self.size + self.increase)
+
+    def on_failure(self, batch):
+        """
+        Shrink after a full-size batch fails or times out, and queue its halves.
+        Returns False when the batch can't be split further, or when failures
+        keep coming back to back (upstream is down, not the batch); the
+        caller then reports those devices as missing.
+        """
+        with self._lock:
+            self.failure_streak += 1
+            if self.failure_streak > self.max_failure_streak:
+                return False
+            # A split half failing says more about its IDs than about the batch size
+            if len(batch) >= self.size:
+                self.size = max(self.min_size, self.size // 2)
+            if len(batch) < 2:
+                return False
+            mid = len(batch) // 2
+            self._retry.appendleft(batch[mid:])
+            self._retry.appendleft(batch[:mid])
+            self.splits += 1
+            return True
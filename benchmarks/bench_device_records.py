@@ -0,0 +1,105 @@
+"""
+Device record pipeline: the old pandas path vs. deviceRecords tuples.
+
+    python benchmarks/bench_device_records.py [N ...]     (default: 10000 100000)
+
+Reports wall time and peak traced memory for building, sorting and
+serialising N records. The pandas baseline is skipped if pandas isn't installed.
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deviceRecords import DeviceRecord, sorted_dicts
+
+FOLDERS = ["default", "Aruba Factory CAP Folder", "Aruba Factory AP", "warehouse", "branch-12"]
+
+
+def fake_upstream(n):
+    rnd = random.Random(42)
+    return [{
+        "serial_number":        f"CN{i:08d}",
+        "mac_address":          f"aa:bb:cc:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+        "device_type":          rnd.choice(["AP", "SWITCH", "GATEWAY"]),
+        "device_model":         rnd.choice(["AP-515", "AP-635", "6300M", "9004"]),
+        "part_number":          rnd.choice(["Q9H62A", "R7J27A", "JL658A"]),
+        "platform_customer_id": f"{rnd.randrange(500):032x}",
+        "folder":               {"folder_name": rnd.choice(FOLDERS)},
+    } for i in range(n)]
+
+
+def pandas_pipeline(devices):
+    import pandas as pd
+
+    def sort_priority(row):
+        folder     = row["Folder Name"]
+        is_default = folder == "default"
+        is_aruba   = "Aruba Factory" in folder
+        if is_default and is_aruba:
+            return 0
+        elif is_default:
+            return 1
+        return 2
+
+    records = [{
+        "Serial Number": d["serial_number"],
+        "MAC Address":   d["mac_address"],
+        "Device Type":   d["device_type"],
+        "Device Model":  d["device_model"],
+        "Part Number":   d["part_number"],
+        "Folder Name":   d["folder"]["folder_name"],
+        "Platform ID":   d["platform_customer_id"],
+    } for d in devices]
+    df = pd.DataFrame(records)
+    df["sort_order"] = df.apply(sort_priority, axis=1)
+    df = df.sort_values(by=["sort_order", "Platform ID"])
+    df.drop(columns="sort_order", inplace=True)
+    return df.to_dict(orient="records")
+
+
+def tuple_pipeline(devices):
+    records = [DeviceRecord(d["serial_number"], d["mac_address"], d["device_type"], d["device_model"],
+                            d["part_number"], d["folder"]["folder_name"], d["platform_customer_id"])
+               for d in devices]
+    return sorted_dicts(records)
+
+
+def measure(fn, devices):
+    # Time and memory come from separate runs; tracemalloc slows everything down
+    t0  = time.perf_counter()
+    out = fn(devices)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(devices)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main(sizes):
+    try:
+        import pandas  # noqa: F401
+        have_pandas = True
+    except ImportError:
+        have_pandas = False
+        print("pandas not installed — baseline skipped")
+
+    print(f"{'records':>8}  {'pipeline':<8}  {'time (s)':>9}  {'peak MiB':>9}")
+    for n in sizes:
+        devices = fake_upstream(n)
+        new, t_new, m_new = measure(tuple_pipeline, devices)
+        if have_pandas:
+            old, t_old, m_old = measure(pandas_pipeline, devices)
+            assert [r["Serial Number"] for r in old] == [r["Serial Number"] for r in new], "sort order differs"
+            print(f"{n:>8}  {'pandas':<8}  {t_old:>9.3f}  {m_old / 2**20:>9.1f}")
+        print(f"{n:>8}  {'tuples':<8}  {t_new:>9.3f}  {m_new / 2**20:>9.1f}")
+        if have_pandas:
+            print(f"{'':>8}  speedup {t_old / t_new:.1f}x, memory {m_old / m_new:.1f}x less")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
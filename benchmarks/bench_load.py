@@ -0,0 +1,279 @@
+"""
+Load test for /api/lookup-stream and /api/subscription-stream against the mock upstream.
+
+    python benchmarks/bench_load.py                                  # devices + subscriptions, 100..10k items
+    python benchmarks/bench_load.py --kind device --sizes 100000 --clients 1 8
+    python benchmarks/bench_load.py --server gunicorn --throttle-rate 0.05
+    python benchmarks/bench_load.py --save baseline.json
+    python benchmarks/bench_load.py --baseline baseline.json --tolerance 0.25
+
+Starts benchmarks/mock_upstream.py in-process (or uses --upstream URL), runs
+the app in a child process pointed at it, and for every kind × size × client
+count fires that many concurrent streams of `size` items. Reports:
+
+    ttfe p50/p99   time from request to first SSE event, across all streams
+    wall p50/p99   time from request to the done event
+    upstream       requests the mock received during the scenario
+    rss MiB        peak RSS of the app process(es) during the scenario (Linux)
+
+The result cache is off (RESULT_CACHE_TTL=0) unless --cache is given, so every
+run does the full upstream work. --baseline exits 1 if any scenario's ttfe p99,
+wall p50 or upstream count is more than --tolerance worse than the saved run.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mock_upstream  # noqa: E402  (same directory)
+
+HEADERS = {"Authorization": "Bearer bench", "Cookie": "session=bench"}
+
+
+# ─── App process ──────────────────────────────────────────────────────────────
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(server, upstream_url, cache):
+    port = _free_port()
+    env  = {**os.environ, "UPSTREAM_BASE_URL": upstream_url, "PYTHONUNBUFFERED": "1"}
+    if not cache:
+        env["RESULT_CACHE_TTL"] = "0"
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "main:app"]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), "--serve-app", str(port)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        if proc.poll() is not None:
+            sys.exit(f"App exited during startup ({' '.join(cmd)})")
+        try:
+            requests.get(base + "/api/cache-stats", timeout=1)
+            return proc, base
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.05)
+    proc.kill()
+    sys.exit("App did not start within 10s")
+
+
+def serve_app(port):
+    """Child-process entry point: the Flask app on a threaded werkzeug server, no debug reloader."""
+    from werkzeug.serving import make_server
+    from main import app
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+# ─── Peak RSS (Linux /proc; other platforms report n/a) ───────────────────────
+def _process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def reset_peak_rss(pid):
+    # Writing 5 to clear_refs resets VmHWM, so each scenario reports its own peak
+    for p in _process_tree(pid):
+        try:
+            with open(f"/proc/{p}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def peak_rss_mib(pid):
+    total = 0
+    for p in _process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return round(total / 1024, 1) if total else None
+
+
+# ─── Scenarios ────────────────────────────────────────────────────────────────
+def make_body(kind, size, mode, run):
+    # A fresh ID range per run, so an enabled cache still sees cold input unless the run repeats
+    if kind == "device":
+        return "/api/lookup-stream", {
+            "devices": "\n".join(f"CN{run:02d}{i:07d}" for i in range(size)),
+            "type": "serial", "parsed_headers": HEADERS, "mode": mode,
+        }
+    return "/api/subscription-stream", {
+        "keys": "\n".join(f"K{run:02d}{i:07d}" for i in range(size)),
+        "parsed_headers": HEADERS, "mode": mode,
+    }
+
+
+def run_stream(base, path, body, out):
+    t0, ttfe, done, events = time.perf_counter(), None, False, 0
+    try:
+        with requests.post(base + path, json=body, stream=True, timeout=(5, 600)) as resp:
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                events += 1
+                if ttfe is None:
+                    ttfe = time.perf_counter() - t0
+                if b'"done"' in line and json.loads(line[5:]).get("type") == "done":
+                    done = True
+    except requests.exceptions.RequestException as e:
+        print(f"  stream failed: {e}")
+    out.append({"ttfe": ttfe, "wall": time.perf_counter() - t0, "done": done, "events": events})
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values) + 0.5) - 1))]
+
+
+def run_scenario(base, app_pid, upstream, kind, size, clients, mode, run):
+    path, body = make_body(kind, size, mode, run)
+    requests.post(upstream + "/__reset", timeout=5)
+    reset_peak_rss(app_pid)
+
+    results = []
+    threads = [threading.Thread(target=run_stream, args=(base, path, body, results)) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    ttfes = [r["ttfe"] for r in results if r["ttfe"] is not None]
+    walls = [r["wall"] for r in results]
+    stats = requests.get(upstream + "/__stats", timeout=5).json()
+    return {
+        "kind": kind, "size": size, "clients": clients,
+        "ttfe_p50": percentile(ttfes, 50), "ttfe_p99": percentile(ttfes, 99),
+        "wall_p50": percentile(walls, 50), "wall_p99": percentile(walls, 99),
+        "elapsed":  elapsed,
+        "upstream": stats["requests"], "upstream_status": stats["status"],
+        "rss_mib":  peak_rss_mib(app_pid),
+        "failed":   sum(not r["done"] for r in results),
+    }
+
+
+def _fmt(value, spec):
+    return "n/a" if value is None else format(value, spec)
+
+
+def print_row(r):
+    throttled = r["upstream_status"].get("429", 0) + r["upstream_status"].get("503", 0)
+    print(f"{r['kind']:<12} {r['size']:>7} {r['clients']:>7}  "
+          f"{_fmt(r['ttfe_p50'], '.3f'):>8} {_fmt(r['ttfe_p99'], '.3f'):>8}  "
+          f"{_fmt(r['wall_p50'], '.2f'):>8} {_fmt(r['wall_p99'], '.2f'):>8}  "
+          f"{r['upstream']:>8} {throttled:>6}  {_fmt(r['rss_mib'], '.1f'):>7}  {r['failed']:>6}")
+
+
+# ─── Regression gate ──────────────────────────────────────────────────────────
+GATED     = ("ttfe_p99", "wall_p50", "upstream")
+MIN_DELTA = {"ttfe_p99": 0.05, "wall_p50": 0.05, "upstream": 0}   # ignore jitter on tiny numbers
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions against a saved run."""
+    saved = {(b["kind"], b["size"], b["clients"]): b for b in baseline}
+    regressions = []
+    for r in results:
+        old = saved.get((r["kind"], r["size"], r["clients"]))
+        if old is None:
+            continue
+        for metric in GATED:
+            if r[metric] is None or not old.get(metric):
+                continue
+            if r[metric] - old[metric] > max(old[metric] * tolerance, MIN_DELTA[metric]):
+                regressions.append(f"{r['kind']} size={r['size']} clients={r['clients']}: "
+                                   f"{metric} {old[metric]:.3f} -> {r[metric]:.3f}")
+        if r["failed"] > old.get("failed", 0):
+            regressions.append(f"{r['kind']} size={r['size']} clients={r['clients']}: "
+                               f"{r['failed']} streams did not finish")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--serve-app", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--kind", choices=["device", "subscription", "both"], default="both")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--mode", choices=["full", "rows"], default="rows")
+    parser.add_argument("--server", choices=["werkzeug", "gunicorn"], default="werkzeug")
+    parser.add_argument("--upstream", help="use a running mock_upstream.py instead of starting one")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache on")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a saved JSON file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    mock_upstream.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        return serve_app(args.serve_app)
+
+    if args.upstream:
+        upstream = args.upstream.rstrip("/")
+    else:
+        upstream = mock_upstream.serve(**mock_upstream.config_from(args)).url
+    proc, base = start_app(args.server, upstream, args.cache)
+    kinds = ["device", "subscription"] if args.kind == "both" else [args.kind]
+
+    print(f"app {base} ({args.server}), upstream {upstream}, mode={args.mode}")
+    print(f"{'kind':<12} {'size':>7} {'clients':>7}  {'ttfe p50':>8} {'ttfe p99':>8}  "
+          f"{'wall p50':>8} {'wall p99':>8}  {'upstream':>8} {'429/5xx':>6}  {'rss MiB':>7}  {'failed':>6}")
+    results = []
+    try:
+        run = 0
+        for kind in kinds:
+            for size in args.sizes:
+                for clients in args.clients:
+                    run += 1
+                    result = run_scenario(base, proc.pid, upstream, kind, size, clients, args.mode, run)
+                    results.append(result)
+                    print_row(result)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
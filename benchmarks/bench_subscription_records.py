@@ -0,0 +1,158 @@
+"""
+Subscription record pipeline: the old per-row datetime/dict transform vs.
+subscriptionRecords' batched one.
+
+    python benchmarks/bench_subscription_records.py [N ...]     (default: 10000 100000)
+
+Both pipelines transform N raw subscriptions spread over keys of 100, dedupe
+them and sort by Workspace, as subscription_events does in full mode.
+Reports:
+
+    lookup      time for that work, which runs while the lookup holds the GIL
+    + dicts     the same plus serialising every row to a dict at the edge
+                (the old pipeline already holds dicts)
+    held MiB    peak traced memory while building the sorted results
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from subscriptionRecords import EpochDates, transform_subscriptions, workspace_key
+
+KEY_SIZE  = 100
+DAY_MS    = 86_400_000
+NOW_MS    = int(time.time() * 1000)
+
+
+def fake_upstream(n):
+    rnd = random.Random(42)
+    # Subscriptions are bought in batches, so start/end days repeat a lot
+    starts = [NOW_MS - rnd.randrange(1500) * DAY_MS for _ in range(200)]
+    keys = {}
+    for i in range(n):
+        start = rnd.choice(starts)
+        keys.setdefault(f"KEY{i // KEY_SIZE:06d}", []).append({
+            "subscription_key":     f"KEY{i // KEY_SIZE:06d}-{i % KEY_SIZE}" if i % KEY_SIZE else f"KEY{i // KEY_SIZE:06d}",
+            "quote":                f"Q{rnd.randrange(10**8):08d}",
+            "appointments":         {"subscription_start": start,
+                                     "subscription_end":   start + rnd.choice((1, 3, 5)) * 365 * DAY_MS},
+            "evaluation_type":      rnd.choice(["NONE", "EVAL"]),
+            "product_description":  rnd.choice(["Foundation AP 5y", "Advanced Switch 3y", "Gateway 1y"]),
+            "quantity":             rnd.choice([10, 50, 100]),
+            "available_quantity":   rnd.randrange(10),
+            "product_sku":          rnd.choice(["Q9Y58AAE", "R3K02AAE", "S1A23AAE"]),
+            "end_user_name":        rnd.choice(["Contoso", "Fabrikam", "Northwind"]),
+            "platform_customer_id": f"{rnd.randrange(300):032x}",
+        })
+    return keys
+
+
+def old_transform(key, all_subs_for_key):
+    # The pre-subscriptionRecords transform, verbatim
+    results = []
+    missing_for_key = []
+    if not all_subs_for_key:
+        missing_for_key.append(key)
+    else:
+        for sub in all_subs_for_key:
+            appointments = sub.get("appointments", {})
+            start_epoch = appointments.get("subscription_start")
+            end_epoch = appointments.get("subscription_end")
+            start_str = datetime.utcfromtimestamp(start_epoch / 1000).strftime("%Y-%m-%d") if start_epoch else ""
+            end_str = datetime.utcfromtimestamp(end_epoch / 1000).strftime("%Y-%m-%d") if end_epoch else ""
+            eval_type = sub.get("evaluation_type", "")
+            if eval_type == "NONE":
+                eval_type = "PAID"
+            is_valid = (
+                end_epoch
+                and datetime.utcnow().date() <= datetime.utcfromtimestamp(end_epoch / 1000).date()
+            )
+            status = "VALID" if is_valid else "EXPIRED"
+            sub_key = sub.get("subscription_key")
+            quote = sub.get("quote")
+            if sub_key and quote:
+                results.append({
+                    "Subscription Key": sub_key,
+                    "Key Description": sub.get("product_description", ""),
+                    "Type": eval_type,
+                    "Quantity": sub.get("quantity", ""),
+                    "Open Seats": sub.get("available_quantity", ""),
+                    "Start Date": start_str,
+                    "End Date": end_str,
+                    "Valid/Expired": status,
+                    "Order ID": quote,
+                    "Product SKU": sub.get("product_sku", ""),
+                    "EndUser Name": sub.get("end_user_name", ""),
+                    "Workspace": sub.get("platform_customer_id", ""),
+                })
+            else:
+                missing_for_key.append(sub_key or key)
+    return results, missing_for_key
+
+
+def old_pipeline(keys):
+    deduped, seen = [], set()
+    for key, subs in keys.items():
+        results, _ = old_transform(key, subs)
+        for r in results:
+            if r["Subscription Key"] not in seen:
+                seen.add(r["Subscription Key"])
+                deduped.append(r)
+    deduped.sort(key=lambda r: (r.get("Workspace") or "").lower())
+    return deduped
+
+
+def new_pipeline(keys):
+    dates = EpochDates()
+    deduped, seen = [], set()
+    for key, subs in keys.items():
+        records, _ = transform_subscriptions(key, subs, dates)
+        for r in records:
+            if r.subscription_key not in seen:
+                seen.add(r.subscription_key)
+                deduped.append(r)
+    deduped.sort(key=workspace_key)
+    return deduped
+
+
+def serialise(records):
+    return [r.as_dict() for r in records]
+
+
+def measure(fn, keys):
+    # Time and memory come from separate runs; tracemalloc slows everything down
+    t0  = time.perf_counter()
+    out = fn(keys)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(keys)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main(sizes):
+    import warnings
+    warnings.simplefilter("ignore", DeprecationWarning)    # utcfromtimestamp/utcnow on 3.12+
+
+    print(f"{'subs':>8}  {'pipeline':<8}  {'lookup (s)':>10}  {'+ dicts (s)':>11}  {'held MiB':>9}")
+    for n in sizes:
+        keys = fake_upstream(n)
+        old, t_old, m_old = measure(old_pipeline, keys)
+        new, t_new, m_new = measure(new_pipeline, keys)
+        t0   = time.perf_counter()
+        rows = serialise(new)
+        t_ser = time.perf_counter() - t0
+        assert old == rows, "output differs"
+        print(f"{n:>8}  {'old':<8}  {t_old:>10.3f}  {t_old:>11.3f}  {m_old / 2**20:>9.1f}")
+        print(f"{n:>8}  {'batched':<8}  {t_new:>10.3f}  {t_new + t_ser:>11.3f}  {m_new / 2**20:>9.1f}")
+        print(f"{'':>8}  lookup {t_old / t_new:.1f}x faster, results held in {m_old / m_new:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
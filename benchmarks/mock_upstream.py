@@ -0,0 +1,219 @@
+"""
+Local stand-in for the HPE support-assistant API, for load tests without live credentials.
+
+    python benchmarks/mock_upstream.py [--port 8700] [--latency 50] [--throttle-rate 0.02] ...
+    UPSTREAM_BASE_URL=http://127.0.0.1:8700 python main.py
+
+Serves the two endpoints the app calls:
+
+    GET /support-assistant/v1alpha1/activate-devices?limit=&page=0&serial_number=|mac_address=
+    GET /support-assistant/v1alpha1/subscriptions?limit=&offset=&subscription_key_pattern=|platform_customer_id=
+
+Answers are deterministic per ID (about MISSING_RATE of them are unknown), so
+two runs over the same input do the same upstream work. Latency, page size,
+5xx/429/401 rates and a share of deep keys are configurable. GET /__stats
+returns request counters; POST /__reset clears them.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULTS = {
+    "latency":       50.0,    # ms per request
+    "jitter":        10.0,    # ± ms, uniform
+    "page_size":     30,      # most subscriptions returned per page, whatever limit asks for
+    "subs_per_key":  3,
+    "deep_rate":     0.0,     # share of keys that have deep_subs subscriptions
+    "deep_subs":     300,
+    "missing_rate":  0.1,     # share of IDs the API doesn't know
+    "error_rate":    0.0,     # 503s
+    "throttle_rate": 0.0,     # 429s
+    "retry_after":   1,       # seconds, sent with every 429
+    "auth_fail_rate": 0.0,    # 401s; tokens containing "expired" always get one ("forbidden": 403)
+}
+
+FOLDERS = ["default", "Aruba Factory CAP Folder", "Aruba Factory AP", "warehouse", "branch-12"]
+DAY_MS  = 86_400_000
+
+
+def _bucket(item, salt=""):
+    """Stable 0..9999 for an ID, so answers don't change between runs."""
+    return zlib.crc32(f"{salt}{item}".encode()) % 10_000
+
+
+def device_payload(item, lookup_type):
+    b = _bucket(item)
+    return {
+        "serial_number":        item if lookup_type == "serial_number" else f"CN{b:06d}{item[-4:]}",
+        "mac_address":          item if lookup_type == "mac_address" else f"aa:bb:cc:00:{b >> 8 & 255:02x}:{b & 255:02x}",
+        "device_type":          ("AP", "SWITCH", "GATEWAY")[b % 3],
+        "device_model":         ("AP-515", "AP-635", "6300M", "9004")[b % 4],
+        "part_number":          ("Q9H62A", "R7J27A", "JL658A")[b % 3],
+        "platform_customer_id": f"{b % 500:032x}",
+        "folder":               {"folder_name": FOLDERS[b % len(FOLDERS)]},
+    }
+
+
+def subscription_payload(key, i):
+    b     = _bucket(key, i)
+    start = 1_600_000_000_000 + b * DAY_MS // 10
+    return {
+        "subscription_key":     key if i == 0 else f"{key}-{i}",
+        "quote":                f"Q{b:05d}",
+        "appointments":         {"subscription_start": start, "subscription_end": start + (b % 2000) * DAY_MS},
+        "evaluation_type":      ("NONE", "EVAL")[b % 2],
+        "product_description":  "Foundation AP subscription",
+        "quantity":             b % 50 + 1,
+        "available_quantity":   b % 10,
+        "product_sku":          f"S{b:04d}",
+        "end_user_name":        f"Customer {b % 200}",
+        "platform_customer_id": f"{b % 500:032x}",
+    }
+
+
+class MockUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = {**DEFAULTS, **config}
+        self._lock  = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"requests": 0, "devices": 0, "subscriptions": 0, "items": 0, "status": {}}
+
+    def record(self, endpoint, items, status):
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts[endpoint]   += 1
+            self.counts["items"]    += items
+            self.counts["status"][str(status)] = self.counts["status"].get(str(status), 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "status": dict(self.counts["status"])}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path == "/__reset":
+            self.server.reset()
+            return self._send(200, {"ok": True})
+        self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        url   = urlparse(self.path)
+        query = parse_qs(url.query)
+        cfg   = self.server.config
+
+        if url.path == "/__stats":
+            return self._send(200, self.server.stats())
+        if url.path.endswith("/activate-devices"):
+            endpoint = "devices"
+        elif url.path.endswith("/subscriptions"):
+            endpoint = "subscriptions"
+        else:
+            return self._send(404, {"error": "not found"})
+
+        time.sleep(max(0.0, cfg["latency"] + random.uniform(-cfg["jitter"], cfg["jitter"])) / 1000)
+
+        auth = self.headers.get("Authorization", "")
+        if "expired" in auth or random.random() < cfg["auth_fail_rate"]:
+            status, body, headers = 401, {"message": "Unauthorized"}, None
+        elif "forbidden" in auth:
+            status, body, headers = 403, {"message": "Forbidden"}, None
+        elif random.random() < cfg["throttle_rate"]:
+            status, body, headers = 429, {"message": "Too Many Requests"}, {"Retry-After": str(cfg["retry_after"])}
+        elif random.random() < cfg["error_rate"]:
+            status, body, headers = 503, {"message": "Service Unavailable"}, None
+        elif endpoint == "devices":
+            status, body, headers = 200, self._devices(query, cfg), None
+        else:
+            status, body, headers = 200, self._subscriptions(query, cfg), None
+
+        items = len(body.get("devices", body.get("subscriptions", [])))
+        self.server.record(endpoint, items, status)
+        self._send(status, body, headers)
+
+    @staticmethod
+    def _devices(query, cfg):
+        lookup_type = "serial_number" if "serial_number" in query else "mac_address"
+        ids         = [i for i in query.get(lookup_type, [""])[0].split(",") if i]
+        cutoff      = cfg["missing_rate"] * 10_000
+        return {"devices": [device_payload(i, lookup_type) for i in ids if _bucket(i) >= cutoff]}
+
+    @staticmethod
+    def _subscriptions(query, cfg):
+        key    = (query.get("subscription_key_pattern") or query.get("platform_customer_id") or [""])[0]
+        offset = int(query.get("offset", ["0"])[0])
+        limit  = min(int(query.get("limit", ["30"])[0]), cfg["page_size"])
+        b      = _bucket(key)
+        if b < cfg["missing_rate"] * 10_000:
+            total = 0
+        elif b >= 10_000 - cfg["deep_rate"] * 10_000:
+            total = cfg["deep_subs"]
+        else:
+            total = cfg["subs_per_key"]
+        subs   = [subscription_payload(key, i) for i in range(offset, min(total, offset + limit))]
+        if "platform_customer_id" in query:
+            for sub in subs:
+                sub["platform_customer_id"] = key
+        return {"subscriptions": subs}
+
+
+def serve(host="127.0.0.1", port=0, **config):
+    """Start a mock upstream on a background thread. port=0 picks a free port; see .url."""
+    server = MockUpstream((host, port), config)
+    threading.Thread(target=server.serve_forever, name="mock-upstream", daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    """Mock knobs as --flags, shared with bench_load.py."""
+    for name, default in DEFAULTS.items():
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, type=type(default), default=default)
+
+
+def config_from(args):
+    return {name: getattr(args, name) for name in DEFAULTS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    add_arguments(parser)
+    args   = parser.parse_args()
+    server = MockUpstream((args.host, args.port), config_from(args))
+    print(f"Mock upstream on {server.url}  (UPSTREAM_BASE_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
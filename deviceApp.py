@@ -1,163 +1,228 @@
-from flask import Blueprint, request, jsonify, Response
-import requests
-import pandas as pd
+from flask import Blueprint, request, jsonify, make_response, Response, send_file
+import csv
 import io
-import json
-import time
+import tempfile
+
+import metrics
+import resultStore
+from deviceRecords import COLUMNS, sort_key
+from inputNormalizer import normalize
+from lookupCore import AUTH_ERROR_MESSAGE, device_lookup, device_result, device_summary, run_device_lookup
+from sseStream import event_stream
+from wireFormat import encode_events
 
 # ─── Config ───────────────────────────────────────────────────────────────────
-BASE_URL_SERIAL = "https://aquila-user-api.common.cloud.hpe.com/support-assistant/v1alpha1/activate-devices?limit={limit}&page=0&serial_number={devices}"
-BASE_URL_MAC    = "https://aquila-user-api.common.cloud.hpe.com/support-assistant/v1alpha1/activate-devices?limit={limit}&page=0&mac_address={devices}"
-BATCH_SIZE = 200
-SLEEP_SEC  = 0.5
-TIMEOUT    = 10
+COL_ORDER         = list(COLUMNS)
+EXPORT_CHUNK_ROWS = 500
+DICT_COLUMNS      = ('Device Type', 'Device Model', 'Part Number', 'Folder Name', 'Platform ID')
 
 device_bp = Blueprint('device', __name__)
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
-def sort_priority(row):
-    folder     = row["Folder Name"]
-    is_default = folder == "default"
-    is_aruba   = "Aruba Factory" in folder
-    if is_default and is_aruba:
-        return 0
-    elif is_default:
-        return 1
-    return 2
-
-
-def process_devices(device_list, lookup_type, extra_headers):
+def parse_device_input(raw_input, lookup_type="serial"):
+    """Canonical, de-duplicated devices plus the invalid entries; see inputNormalizer."""
+    return normalize(raw_input, "mac" if lookup_type == "mac" else "serial")
+
+
+def _no_valid_input(inputs, what="devices"):
+    if inputs.invalid:
+        return jsonify({"error": f"No valid {what} provided", **inputs.report()}), 400
+    return jsonify({"error": f"No {what} provided"}), 400
+
+
+def process_devices(device_list, lookup_type, extra_headers, use_cache=True):
     """
-    Non-streaming version used by /api/export.
-    Logic mirrors the original Python script exactly.
+    Non-streaming lookup used by /api/lookup and /api/export.
+    Returns ('ok', sorted records, missing) or ('auth_error', status_code, None).
     """
-    base_url = BASE_URL_SERIAL if lookup_type == "serial" else BASE_URL_MAC
-    platform_device_records = []
-    missing_devices = []
-
-    for batch_start in range(0, len(device_list), BATCH_SIZE):
-        batch       = device_list[batch_start: batch_start + BATCH_SIZE]
-        devices_str = ",".join(batch)
-        url         = base_url.format(limit=len(batch), devices=devices_str)
-
-        print(f"Processing batch {batch_start // BATCH_SIZE + 1} with {len(batch)} devices...")
-
-        try:
-            response = requests.get(url, headers=extra_headers, timeout=TIMEOUT)
-            response.raise_for_status()
-            data         = response.json()
-            devices_data = data.get("devices", [])
-            received_devices = set()
-
-            for dev in devices_data:
-                serial_number = dev.get("serial_number")
-                mac_address   = dev.get("mac_address")
-                device_type   = dev.get("device_type")
-                device_model  = dev.get("device_model")
-                part_number   = dev.get("part_number")
-                platform_id   = dev.get("platform_customer_id")
-                folder_name   = dev.get("folder", {}).get("folder_name", "")
-
-                tracked = (mac_address if lookup_type == "mac" else serial_number) or ""
-                if tracked:
-                    received_devices.add(tracked.upper())
-
-                if serial_number and mac_address and platform_id and folder_name:
-                    platform_device_records.append({
-                        "Serial Number": serial_number,
-                        "MAC Address":   mac_address,
-                        "Device Type":   device_type,
-                        "Device Model":  device_model,
-                        "Part Number":   part_number,
-                        "Folder Name":   folder_name,
-                        "Platform ID":   platform_id,
-                    })
-                else:
-                    missing_id = (mac_address if lookup_type == "mac" else serial_number) or "unknown"
-                    missing_devices.append(missing_id)
-
-            for dev in batch:
-                if dev.upper() not in received_devices:
-                    missing_devices.append(dev)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Request error on batch {batch_start // BATCH_SIZE + 1}: {e}")
-            for dev in batch:
-                missing_devices.append(dev)
-
-        print(f"Finished batch {batch_start // BATCH_SIZE + 1}")
-        time.sleep(SLEEP_SEC)
-
-    df = pd.DataFrame(platform_device_records)
-    if not df.empty:
-        df["sort_order"] = df.apply(sort_priority, axis=1)
-        df = df.sort_values(by=["sort_order", "Platform ID"])
-        df.drop(columns="sort_order", inplace=True)
-
-    return df, missing_devices
+    return run_device_lookup(device_list, lookup_type, extra_headers, use_cache)
 
 
-# ─── Routes ───────────────────────────────────────────────────────────────────
-@device_bp.route("/api/lookup", methods=["POST"])
-def lookup():
-    body           = request.get_json(force=True)
-    raw_input      = body.get("devices", "")
-    lookup_type    = body.get("type", "serial")
-    parsed_headers = body.get("parsed_headers", {})
+def _first_seen(items, seen):
+    fresh = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            fresh.append(item)
+    return fresh
 
-    device_list = [d.strip() for d in raw_input.replace("\n", ",").split(",") if d.strip()]
-    if not device_list:
-        return jsonify({"error": "No devices provided"}), 400
 
-    extra_headers = parsed_headers if parsed_headers else {}
-    df, missing   = process_devices(device_list, lookup_type, extra_headers)
-    records       = df.to_dict(orient="records") if not df.empty else []
+def lookup_events(inputs, lookup_type, extra_headers, use_cache=True, mode="full"):
+    """
+    SSE adapter over lookupCore.device_lookup for a NormalizedInput: progress,
+    auth_error and done events. Progress carries the adaptive batch sizes
+    (batch_size, next_batch_size, splits). Missing devices are reported as
+    originally pasted, and done adds the invalid/duplicate counts.
+    mode="rows" also emits each batch's new (deduplicated) records as a 'rows'
+    event and leaves them out of done, which then carries only summary counts.
+    Missing entries are passed through as in full mode, repeated "unknown"
+    placeholders included, so both modes report the same missing_count.
+    """
+    device_list   = inputs.items
+    total_devices = len(device_list)
+    stream_rows   = mode == "rows"
+    records, missing = [], []
+    seen_records = set()
+    queried, cached, total_batches = 0, 0, 0
+    batch_size = next_size = splits = 0
+
+    for event in device_lookup(device_list, lookup_type, extra_headers, use_cache):
+        kind = event['kind']
+        if kind == 'auth_error':
+            yield {'type':'auth_error','status':event['status'],'message':AUTH_ERROR_MESSAGE}
+            return
+        if stream_rows:
+            new_records = _first_seen(event['records'], seen_records)
+            new_missing = [inputs.original(m) for m in event['missing']]
+            if new_records or new_missing:
+                yield {'type':'rows','devices':[r.as_dict() for r in new_records],'missing':new_missing}
+        else:
+            new_records = event['records']
+            new_missing = [inputs.original(m) for m in event['missing']]
+        records.extend(new_records)
+        missing.extend(new_missing)
+        if kind == 'start':
+            cached        = event['cached']
+            total_batches = event['total_batches']
+            next_size     = event['batch_size']
+            queried       = cached
+            batch         = 0
+        else:
+            batch         = event['batch']
+            total_batches = event['total_batches']
+            batch_size    = event['size']
+            next_size     = event['next_size']
+            splits        = event['splits']
+            queried      += event['size']
+        pct = round((queried / total_devices) * 100)
+        yield {'type':'progress','pct':pct,'queried':queried,'total':total_devices,'found':len(records),'batch':batch,'total_batches':total_batches,'cached':cached,
+               'batch_size':batch_size,'next_batch_size':next_size,'splits':splits}
+
+    records.sort(key=sort_key)
+    result_id = resultStore.put({"records": records, "missing": missing})
+    if stream_rows:
+        result = device_summary(total_devices, len(records), len(missing))
+    else:
+        result = device_result(total_devices, records, missing)
+    result.update(inputs.report())
 
-    total         = len(device_list)
-    found         = len(records)
-    missing_count = len(missing)
+    yield {'type':'progress','pct':100,'queried':total_devices,'total':total_devices,'found':result['found'],'batch':total_batches,'total_batches':total_batches,'cached':cached,
+           'batch_size':batch_size,'next_batch_size':next_size,'splits':splits}
+    yield {'type':'done','data':result,'result_id':result_id}
 
-    return jsonify({
-        "total":         total,
-        "found":         found,
-        "missing_count": missing_count,
-        "found_pct":     round(found / total * 100, 1) if total else 0,
-        "missing_pct":   round(missing_count / total * 100, 1) if total else 0,
-        "devices":       records,
-        "missing":       missing,
-    })
 
+def _auth_error_response(status_code):
+    return jsonify({"error": AUTH_ERROR_MESSAGE, "auth_error": True, "status": status_code}), status_code
 
-@device_bp.route("/api/export", methods=["POST"])
-def export():
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+@device_bp.route("/api/lookup", methods=["POST"])
+def lookup():
     body           = request.get_json(force=True)
     raw_input      = body.get("devices", "")
     lookup_type    = body.get("type", "serial")
     parsed_headers = body.get("parsed_headers", {})
-    export_type    = body.get("export", "found")
-    columns        = body.get("columns", None)
 
-    device_list   = [d.strip() for d in raw_input.replace("\n", ",").split(",") if d.strip()]
-    extra_headers = parsed_headers if parsed_headers else {}
+    inputs = parse_device_input(raw_input, lookup_type)
+    if not inputs.items:
+        return _no_valid_input(inputs)
 
-    df, missing = process_devices(device_list, lookup_type, extra_headers)
+    device_list   = inputs.items
+    extra_headers = parsed_headers if parsed_headers else {}
+    use_cache     = not body.get("refresh", False)
+    request_id    = metrics.new_request_id(request.headers.get("X-Request-ID"))
+    with metrics.traced(request_id, "lookup") as state:
+        status, records, missing = process_devices(device_list, lookup_type, extra_headers, use_cache)
+        state["outcome"] = "done" if status == "ok" else status
+        if status == "auth_error":
+            response = _auth_error_response(records)
+        else:
+            missing  = [inputs.original(m) for m in missing]
+            response = jsonify({**device_result(len(device_list), records, missing), **inputs.report()})
+            metrics.ROWS_EMITTED.inc(len(records), stream="lookup")
+            metrics.record(rows=len(records))
+    response = make_response(response)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def _export_table(result, export_type, columns):
+    """Returns (header, row iterator) for a stored or fresh {records, missing} lookup result."""
+    if export_type == "missing":
+        return ["Missing Device"], ([m] for m in result["missing"])
+    cols = [c for c in COL_ORDER if c in columns] if columns else []
+    cols = cols or COL_ORDER
+    idx  = [COL_ORDER.index(c) for c in cols]
+    return cols, ([rec[i] for i in idx] for rec in result["records"])
+
+
+def _csv_chunks(header, rows):
+    buf    = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _xlsx_file(header, rows):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    wb.save(out)
+    out.seek(0)
+    return out
 
-    COL_ORDER = ['Serial Number', 'MAC Address', 'Device Type', 'Device Model', 'Part Number', 'Folder Name', 'Platform ID']
 
-    if export_type == "missing":
-        out_df = pd.DataFrame({"Missing Device": missing})
+@device_bp.route("/api/export", methods=["POST"])
+def export():
+    """
+    Export a lookup result as CSV (streamed) or XLSX. Pass the result_id from
+    the stream's done event to reuse that run; the legacy devices/type body
+    still works but re-queries upstream.
+    """
+    body        = request.get_json(force=True)
+    export_type = body.get("export", "found")
+    columns     = body.get("columns", None)
+    file_format = body.get("format", "csv")
+    result_id   = body.get("result_id")
+
+    if result_id:
+        result = resultStore.get(result_id)
+        if result is None:
+            return jsonify({"error": "Result expired or not found — run the lookup again."}), 404
     else:
-        out_df = df if not df.empty else pd.DataFrame()
-        if columns and not out_df.empty:
-            valid_cols = [c for c in COL_ORDER if c in columns and c in out_df.columns]
-            if valid_cols:
-                out_df = out_df[valid_cols]
-
-    buf = io.StringIO()
-    out_df.to_csv(buf, index=False)
+        lookup_type    = body.get("type", "serial")
+        parsed_headers = body.get("parsed_headers", {})
+        inputs         = parse_device_input(body.get("devices", ""), lookup_type)
+        extra_headers  = parsed_headers if parsed_headers else {}
+        use_cache      = not body.get("refresh", False)
+        status, records, missing = process_devices(inputs.items, lookup_type, extra_headers, use_cache)
+        if status == "auth_error":
+            return _auth_error_response(records)
+        result = {"records": records, "missing": [inputs.original(m) for m in missing]}
+
+    header, rows = _export_table(result, export_type, columns)
+
+    if file_format == "xlsx":
+        return send_file(
+            _xlsx_file(header, rows),
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            as_attachment=True,
+            download_name=f"{export_type}_devices.xlsx",
+        )
 
     return Response(
-        buf.getvalue(),
+        _csv_chunks(header, rows),
         mimetype="text/csv",
         headers={"Content-Disposition": f"attachment; filename={export_type}_devices.csv"}
     )
@@ -170,107 +235,13 @@ def lookup_stream():
     lookup_type    = body.get("type", "serial")
     parsed_headers = body.get("parsed_headers", {})
 
-    device_list = [d.strip() for d in raw_input.replace("\n", ",").split(",") if d.strip()]
-    if not device_list:
-        return jsonify({"error": "No devices provided"}), 400
+    inputs = parse_device_input(raw_input, lookup_type)
+    if not inputs.items:
+        return _no_valid_input(inputs)
 
     extra_headers = parsed_headers if parsed_headers else {}
-    base_url      = BASE_URL_SERIAL if lookup_type == "serial" else BASE_URL_MAC
-    total_devices = len(device_list)
-    total_batches = (total_devices + BATCH_SIZE - 1) // BATCH_SIZE
-
-    def generate():
-        platform_device_records = []
-        missing_devices         = []
-
-        for batch_idx, batch_start in enumerate(range(0, total_devices, BATCH_SIZE)):
-            batch       = device_list[batch_start: batch_start + BATCH_SIZE]
-            devices_str = ",".join(batch)
-            url         = base_url.format(limit=len(batch), devices=devices_str)
-            batch_num   = batch_idx + 1
-
-            pct = round((batch_start / total_devices) * 100)
-            yield f"data: {json.dumps({'type':'progress','pct':pct,'queried':batch_start,'total':total_devices,'found':len(platform_device_records),'batch':batch_num,'total_batches':total_batches})}\n\n"
-
-            print(f"Processing batch {batch_num}/{total_batches} with {len(batch)} devices...")
-
-            try:
-                response = requests.get(url, headers=extra_headers, timeout=TIMEOUT)
-                response.raise_for_status()
-                data         = response.json()
-                devices_data = data.get("devices", [])
-                received_devices = set()
-
-                for dev in devices_data:
-                    serial_number = dev.get("serial_number")
-                    mac_address   = dev.get("mac_address")
-                    device_type   = dev.get("device_type")
-                    device_model  = dev.get("device_model")
-                    part_number   = dev.get("part_number")
-                    platform_id   = dev.get("platform_customer_id")
-                    folder_name   = dev.get("folder", {}).get("folder_name", "")
-
-                    tracked = (mac_address if lookup_type == "mac" else serial_number) or ""
-                    if tracked:
-                        received_devices.add(tracked.upper())
-
-                    if serial_number and mac_address and platform_id and folder_name:
-                        platform_device_records.append({
-                            "Serial Number": serial_number,
-                            "MAC Address":   mac_address,
-                            "Device Type":   device_type,
-                            "Device Model":  device_model,
-                            "Part Number":   part_number,
-                            "Folder Name":   folder_name,
-                            "Platform ID":   platform_id,
-                        })
-                    else:
-                        missing_id = (mac_address if lookup_type == "mac" else serial_number) or "unknown"
-                        missing_devices.append(missing_id)
-
-                for dev in batch:
-                    if dev.upper() not in received_devices:
-                        missing_devices.append(dev)
-
-            except requests.exceptions.RequestException as e:
-                print(f"Request error on batch {batch_num}: {e}")
-                status_code = getattr(getattr(e, 'response', None), 'status_code', None)
-                if status_code in (401, 403):
-                    yield f"data: {json.dumps({'type':'auth_error','status':status_code,'message':'Authentication failed — your Authorization/Cookie headers are expired or invalid. Please update and retry.'})}\n\n"
-                    return
-                for dev in batch:
-                    missing_devices.append(dev)
-
-            queried_now = batch_start + len(batch)
-            pct = round((queried_now / total_devices) * 100)
-            yield f"data: {json.dumps({'type':'progress','pct':pct,'queried':queried_now,'total':total_devices,'found':len(platform_device_records),'batch':batch_num,'total_batches':total_batches})}\n\n"
-
-            print(f"Finished batch {batch_num}/{total_batches}")
-            time.sleep(SLEEP_SEC)
-
-        # ── Final sort and result ─────────────────────────────────────
-        df = pd.DataFrame(platform_device_records)
-        if not df.empty:
-            df["sort_order"] = df.apply(sort_priority, axis=1)
-            df = df.sort_values(by=["sort_order", "Platform ID"])
-            df.drop(columns="sort_order", inplace=True)
-
-        records       = df.to_dict(orient="records") if not df.empty else []
-        found         = len(records)
-        missing_count = len(missing_devices)
-
-        result = {
-            "total":         total_devices,
-            "found":         found,
-            "missing_count": missing_count,
-            "found_pct":     round(found / total_devices * 100, 1) if total_devices else 0,
-            "missing_pct":   round(missing_count / total_devices * 100, 1) if total_devices else 0,
-            "devices":       records,
-            "missing":       missing_devices,
-        }
-
-        yield f"data: {json.dumps({'type':'progress','pct':100,'queried':total_devices,'total':total_devices,'found':found,'batch':total_batches,'total_batches':total_batches})}\n\n"
-        yield f"data: {json.dumps({'type':'done','data':result})}\n\n"
-
-    return Response(generate(), mimetype="text/event-stream",
-                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
\ No newline at end of file
+    use_cache     = not body.get("refresh", False)
+    mode          = body.get("mode", "full")
+    events        = lookup_events(inputs, lookup_type, extra_headers, use_cache, mode)
+    events        = encode_events(events, "devices", COLUMNS, DICT_COLUMNS, body.get("encoding"))
+    return event_stream(events, "lookup-stream")
@@ -0,0 +1,43 @@
+from typing import NamedTuple
+
+# Display column names, in the order the UI and exports use them
+COLUMNS = ('Serial Number', 'MAC Address', 'Device Type', 'Device Model', 'Part Number', 'Folder Name', 'Platform ID')
+
+
+class DeviceRecord(NamedTuple):
+    """
+    One found device. Tuple-backed so a 100k-row lookup holds no per-row dicts
+    until the result is serialised at the edge with as_dict().
+    """
+    serial_number: str
+    mac_address:   str
+    device_type:   str
+    device_model:  str
+    part_number:   str
+    folder_name:   str
+    platform_id:   str
+
+    def as_dict(self):
+        return dict(zip(COLUMNS, self))
+
+
+def folder_priority(folder):
+    """0 = default + Aruba Factory, 1 = default, 2 = everything else."""
+    is_default = folder == "default"
+    is_aruba   = "Aruba Factory" in folder
+    if is_default and is_aruba:
+        return 0
+    elif is_default:
+        return 1
+    return 2
+
+
+def sort_key(record):
+    """Folder priority, then Platform ID — the order the DataFrame sort used to produce."""
+    return (folder_priority(record.folder_name), record.platform_id)
+
+
+def sorted_dicts(records):
+    """Sort records in place and serialise them for JSON/SSE output."""
+    records.sort(key=sort_key)
+    return [dict(zip(COLUMNS, rec)) for rec in records]
@@ -1,4 +1,14 @@
+import os
+
 # Gunicorn config so timeout applies even when Render uses a custom start command
 # (Procfile may be overridden in Render dashboard)
 timeout = 300
 workers = 1
+
+# One process serves many SSE streams at once: each stream parks a thread
+# (gthread) or a greenlet (gevent, `pip install gevent`) on upstream I/O instead
+# of blocking the whole worker. Upstream load across all streams is capped by
+# UPSTREAM_MAX_IN_FLIGHT in upstreamClient.py.
+worker_class       = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads            = int(os.environ.get("GUNICORN_THREADS", 32))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 200))
@@ -0,0 +1,105 @@
+import re
+from typing import NamedTuple
+
+# ─── Formats ──────────────────────────────────────────────────────────────────
+# Entries are separated by commas, semicolons, whitespace or quotes (CSV/Excel pastes)
+_TOKEN      = re.compile(r"[^\s,;\"']+")
+_MAC_STRIP  = str.maketrans("", "", ":-.")
+_MAC_HEX    = re.compile(r"[0-9A-F]{12}")
+# Serials and subscription keys are alphanumeric with at least one digit, which
+# also rejects header words like "Serial" or "Number" pasted from a spreadsheet
+_SERIAL     = re.compile(r"(?=[A-Z-]*\d)[A-Z0-9][A-Z0-9-]{3,31}")
+_SUB_KEY    = re.compile(r"(?=[A-Z-]*\d)[A-Z0-9][A-Z0-9-]{3,63}")
+MAX_INVALID_KEPT = 1000   # rejects echoed back to the client; the count is always exact
+
+
+def canonical_mac(value):
+    """AA:BB:CC:DD:EE:FF from any of aa:bb:.., AA-BB-.., aabb.ccdd.eeff or bare hex; None if malformed."""
+    digits = value.translate(_MAC_STRIP).upper()
+    if not _MAC_HEX.fullmatch(digits):
+        return None
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def canonical_serial(value):
+    value = value.upper()
+    return value if _SERIAL.fullmatch(value) else None
+
+
+def canonical_key(value):
+    value = value.upper()
+    return value if _SUB_KEY.fullmatch(value) else None
+
+
+CANONICAL = {"serial": canonical_serial, "mac": canonical_mac, "subscription": canonical_key}
+
+
+class NormalizedInput(NamedTuple):
+    """
+    Lookup input after normalisation: unique canonical items in first-seen
+    order, each mapped back to the spelling the user first pasted.
+    """
+    items:         list
+    originals:     dict     # canonical -> first original spelling, only where they differ
+    invalid:       list     # raw entries rejected locally (first MAX_INVALID_KEPT), never sent upstream
+    invalid_count: int
+    duplicates:    int
+
+    def original(self, item):
+        return self.originals.get(item, item)
+
+    def report(self):
+        """Counts and rejects for the done payload."""
+        return {"invalid": self.invalid, "invalid_count": self.invalid_count, "duplicates": self.duplicates}
+
+
+def tokens(raw):
+    """Split a pasted string, or iterate an iterable of strings, into raw entries."""
+    if isinstance(raw, str):
+        return _TOKEN.findall(raw)
+    return (t for chunk in raw for t in _TOKEN.findall(chunk))
+
+
+class Normalizer:
+    """
+    Incremental form of normalize() for input that arrives in chunks, e.g.
+    rows streamed out of an uploaded file: feed() each chunk, then result().
+    """
+
+    def __init__(self, kind):
+        self._canonical    = CANONICAL[kind]
+        self._seen         = set()
+        self.items         = []
+        self.originals     = {}
+        self.invalid       = []
+        self.invalid_count = 0
+        self.duplicates    = 0
+
+    def feed(self, entries):
+        canonical, seen = self._canonical, self._seen
+        for token in entries:
+            item = canonical(token)
+            if item is None:
+                self.invalid_count += 1
+                if len(self.invalid) < MAX_INVALID_KEPT:
+                    self.invalid.append(token)
+            elif item in seen:
+                self.duplicates += 1
+            else:
+                seen.add(item)
+                self.items.append(item)
+                if item != token:
+                    self.originals[item] = token
+        return self
+
+    def result(self):
+        return NormalizedInput(self.items, self.originals, self.invalid, self.invalid_count, self.duplicates)
+
+
+def normalize(raw, kind):
+    """
+    Canonicalise, validate and de-duplicate `raw` for a lookup of `kind`
+    ('serial', 'mac' or 'subscription'). Upstream work then scales with
+    unique valid items only.
+    """
+    return Normalizer(kind).feed(tokens(raw)).result()
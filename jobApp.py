@@ -0,0 +1,208 @@
+from flask import Blueprint, request, jsonify, Response
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import metrics
+import resultCache
+from deviceApp import parse_device_input, lookup_events
+from subscriptionApp import parse_key_input, subscription_events
+from sseStream import SSE_HEADERS, format_event, traced_events
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+JOB_WORKERS   = int(os.environ.get("JOB_WORKERS", 4))
+JOB_TTL       = float(os.environ.get("JOB_TTL", 3600))   # seconds a finished job is kept
+JOB_MAX       = int(os.environ.get("JOB_MAX", 20))       # finished jobs kept; oldest go first
+KEEPALIVE_SEC = 15
+
+job_bp = Blueprint('job', __name__)
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs     = {}          # job_id -> Job
+_by_print = {}          # fingerprint -> job_id, so identical submissions share one run
+_lock     = threading.Lock()
+
+
+class Job:
+    """
+    One background lookup. Events are appended to an in-memory log so any
+    number of clients can (re)attach and replay from their Last-Event-ID.
+    """
+
+    def __init__(self, kind, fingerprint, events):
+        self.id          = uuid.uuid4().hex
+        self.kind        = kind
+        self.fingerprint = fingerprint
+        self.status      = "queued"
+        self.created     = time.time()
+        self.finished    = None
+        self.result      = None
+        self.events      = []
+        self._events_gen = events
+        self._cond       = threading.Condition()
+
+    def _append(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def run(self):
+        self.status = "running"
+        try:
+            # The job id doubles as the correlation id for its events and logs
+            for event in traced_events(self._events_gen, self.id, f"job-{self.kind}"):
+                if event["type"] == "done":
+                    self.result = event["data"]
+                    self.status = "done"
+                elif event["type"] == "auth_error":
+                    self.status = "auth_error"
+                self._append(event)
+            if self.status == "running":
+                self.status = "done"
+        except Exception as e:
+            metrics.log("job_failed", job_id=self.id, error=str(e))
+            self.status = "error"
+            self._append({'type':'error','error':str(e)})
+        finally:
+            self._events_gen = None
+            with self._cond:
+                self.finished = time.time()
+                self._cond.notify_all()
+            _purge_expired()
+
+    def wait_for(self, index, timeout):
+        """Block until event `index` exists or the job has finished."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > index or self.finished, timeout)
+
+    def summary(self):
+        last = self.events[-1] if self.events else {}
+        return {
+            "job_id":   self.id,
+            "kind":     self.kind,
+            "status":   self.status,
+            "pct":      last.get("pct", 100 if self.finished else 0),
+            "events":   len(self.events),
+            "created":  self.created,
+            "finished": self.finished,
+        }
+
+
+def _purge_expired():
+    """
+    Drop finished jobs past JOB_TTL, then the oldest finished ones beyond
+    JOB_MAX: each holds its whole event log, done payload included.
+    Queued and running jobs are never dropped.
+    """
+    now = time.time()
+    with _lock:
+        finished = sorted((job for job in _jobs.values() if job.finished), key=lambda job: job.finished)
+        expired  = [job for job in finished if now - job.finished > JOB_TTL]
+        kept     = finished[len(expired):]
+        for job in expired + kept[:max(0, len(kept) - JOB_MAX)]:
+            del _jobs[job.id]
+            if _by_print.get(job.fingerprint) == job.id:
+                del _by_print[job.fingerprint]
+
+
+def _fingerprint(kind, lookup_type, items, headers):
+    h = hashlib.sha256()
+    for part in (kind, lookup_type, resultCache.identity(headers)):
+        h.update(part.encode())
+        h.update(b"\0")
+    for item in items:
+        h.update(item.encode())
+        h.update(b",")
+    return h.hexdigest()
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+@job_bp.route("/api/jobs", methods=["POST"])
+def create_job():
+    body           = request.get_json(force=True)
+    kind           = body.get("kind", "device")
+    parsed_headers = body.get("parsed_headers", {}) or {}
+    use_cache      = not body.get("refresh", False)
+
+    if kind == "device":
+        lookup_type = body.get("type", "serial")
+        inputs      = parse_device_input(body.get("devices", ""), lookup_type)
+        if not inputs.items:
+            return jsonify({"error": "No valid devices provided", **inputs.report()}), 400
+        events = lookup_events(inputs, lookup_type, parsed_headers, use_cache)
+    elif kind == "subscription":
+        lookup_type = ""
+        inputs      = parse_key_input(body.get("keys", ""))
+        if not inputs.items:
+            return jsonify({"error": "No valid subscription keys provided.", **inputs.report()}), 400
+        events = subscription_events(inputs, parsed_headers, use_cache)
+    else:
+        return jsonify({"error": f"Unknown job kind: {kind}"}), 400
+
+    _purge_expired()
+    fingerprint = _fingerprint(kind, lookup_type, sorted(inputs.items), parsed_headers)
+    with _lock:
+        existing = _jobs.get(_by_print.get(fingerprint))
+        # A running or successful identical job is reused; failed ones are retried
+        if existing and existing.status in ("queued", "running", "done") and use_cache:
+            events.close()
+            return jsonify({**existing.summary(), "reused": True}), 200
+        job = Job(kind, fingerprint, events)
+        _jobs[job.id]          = job
+        _by_print[fingerprint] = job.id
+
+    _executor.submit(job.run)
+    return jsonify({**job.summary(), "reused": False}), 202
+
+
+@job_bp.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = _jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
+
+@job_bp.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = _jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+
+    # EventSource sends Last-Event-ID on reconnect; fetch() clients can use ?last_event_id=
+    last_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id", "-1"))
+    try:
+        start = int(last_id) + 1
+    except ValueError:
+        start = 0
+
+    def generate():
+        index = max(start, 0)
+        while True:
+            job.wait_for(index, KEEPALIVE_SEC)
+            if index < len(job.events):
+                for event in job.events[index:]:
+                    yield format_event(event, event_id=index)
+                    index += 1
+            elif job.finished:
+                return
+            else:
+                yield ": keepalive\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@job_bp.route("/api/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    job = _jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == "done":
+        return jsonify(job.result)
+    if job.finished:
+        last = job.events[-1] if job.events else {}
+        return jsonify({**job.summary(), "error": last.get("message") or last.get("error")}), 409
+    return jsonify(job.summary()), 202
@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import os
+import requests
+
+import metrics
+import resultCache
+import upstreamClient
+from batchPlanner import BatchPlanner
+from deviceRecords import DeviceRecord, sort_key, sorted_dicts
+from inputNormalizer import canonical_mac
+from rateLimiter import AdaptiveRateLimiter
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+BASE_URL_SERIAL = upstreamClient.BASE_URL + "/support-assistant/v1alpha1/activate-devices?limit={limit}&page=0&serial_number={devices}"
+BASE_URL_MAC    = upstreamClient.BASE_URL + "/support-assistant/v1alpha1/activate-devices?limit={limit}&page=0&mac_address={devices}"
+# First batch size; BatchPlanner then adapts it between BATCH_MIN and BATCH_MAX
+BATCH_SIZE           = 200
+BATCH_MIN            = 10
+BATCH_MAX            = int(os.environ.get("DEVICE_BATCH_MAX", 400))
+BATCH_TARGET_LATENCY = 2.0     # seconds; faster batches grow the size, ones over twice this shrink it
+MAX_URL_LENGTH       = 8000    # bytes; common proxy/server limit on the request line
+# Failed batches with these statuses (or timeouts) are split in half and retried.
+# They point at the batch's contents, so upstreamClient neither retries them as
+# they are nor throttles the limiter the lookup's healthy batches share.
+SPLIT_STATUSES       = {400, 413, 414, 422, 500}
+RETRY_STATUSES       = upstreamClient.RETRY_STATUSES - SPLIT_STATUSES
+# Batches run in parallel; the adaptive limiter paces them instead of a fixed sleep
+MAX_CONCURRENT_BATCHES = 4
+RATE_START             = 2.0    # requests/sec, adapts between RATE_MIN and RATE_MAX
+RATE_MIN               = 0.5
+RATE_MAX               = 10.0
+
+AUTH_ERROR_MESSAGE = 'Authentication failed — your Authorization/Cookie headers are expired or invalid. Please update and retry.'
+
+
+def _fetch_batch(batch, base_url, lookup_type, extra_headers, limiter=None):
+    """
+    _request_batch under a timing span: the logged ms against upstream_ms
+    shows how much of a batch went to limiter/backoff waits and parsing.
+    """
+    with metrics.span("device_batch_fetch", size=len(batch)) as fields:
+        result = _request_batch(batch, base_url, lookup_type, extra_headers, limiter)
+        fields["status"] = result[0]
+        if result[0] == "ok":
+            fields["found"]       = len(result[1])
+            fields["upstream_ms"] = round(result[4] * 1000, 1)
+        return result
+
+
+def _request_batch(batch, base_url, lookup_type, extra_headers, limiter=None):
+    """
+    Fetch one batch, optionally under a rate limiter. Returns one of
+    ('ok', records, missing, per_item, latency), ('auth_error', status_code, None, None, None)
+    or ('error', splittable, None, None, None) when the request failed after retries.
+    per_item maps each upper-cased input ID to its cacheable outcome; latency
+    is the seconds spent in HTTP, excluding limiter and backoff waits.
+    """
+    devices_str = ",".join(batch)
+    url         = base_url.format(limit=len(batch), devices=devices_str)
+    records, missing = [], []
+    metrics.BATCH_SIZE.observe(len(batch))
+
+    try:
+        response = upstreamClient.get(url, headers=extra_headers, limiter=limiter,
+                                          retry_statuses=RETRY_STATUSES)
+        response.raise_for_status()
+        latency      = response.timing["elapsed"] - response.timing["waited"]
+        data         = response.json()
+        devices_data = data.get("devices", [])
+        by_item      = {}
+
+        for dev in devices_data:
+            serial_number = dev.get("serial_number")
+            mac_address   = dev.get("mac_address")
+            device_type   = dev.get("device_type")
+            device_model  = dev.get("device_model")
+            part_number   = dev.get("part_number")
+            platform_id   = dev.get("platform_customer_id")
+            folder_name   = dev.get("folder", {}).get("folder_name", "")
+
+            tracked = (mac_address if lookup_type == "mac" else serial_number) or ""
+            entry   = None
+            if tracked:
+                # Match in the same canonical form the input was normalised to
+                tracked = (canonical_mac(tracked) if lookup_type == "mac" else None) or tracked.upper()
+                entry   = by_item.setdefault(tracked, {"records": [], "incomplete": [], "received": True})
+
+            if serial_number and mac_address and platform_id and folder_name:
+                record = DeviceRecord(serial_number, mac_address, device_type, device_model,
+                                      part_number, folder_name, platform_id)
+                records.append(record)
+                if entry is not None:
+                    entry["records"].append(record)
+            else:
+                missing_id = (mac_address if lookup_type == "mac" else serial_number) or "unknown"
+                missing.append(missing_id)
+                if entry is not None:
+                    entry["incomplete"].append(missing_id)
+
+        for dev in batch:
+            if dev.upper() not in by_item:
+                missing.append(dev)
+
+        not_received = {"records": [], "incomplete": [], "received": False}
+        per_item = {dev.upper(): by_item.get(dev.upper(), not_received) for dev in batch}
+
+    except requests.exceptions.RequestException as e:
+        status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+        if status_code in (401, 403):
+            return ("auth_error", status_code, None, None, None)
+        metrics.log("device_batch_error", size=len(batch), status=status_code, error=str(e))
+        # Rejections and timeouts may be down to this batch's size or contents, so the
+        # caller splits it; 502/503/504 and connection errors mean upstream itself is down
+        splittable = isinstance(e, requests.exceptions.Timeout) or status_code in SPLIT_STATUSES
+        return ("error", splittable, None, None, None)
+
+    return ("ok", records, missing, per_item, latency)
+
+
+def _split_cached(device_list, namespace, ident, use_cache):
+    """Resolve what we can from the result cache. Returns (records, missing, pending devices)."""
+    if not use_cache:
+        return [], [], list(device_list)
+
+    keys    = [d.upper() for d in device_list]
+    hits, _ = resultCache.cache.get_many(namespace, ident, list(dict.fromkeys(keys)))
+    records, missing, pending = [], [], []
+    for dev, key in zip(device_list, keys):
+        hit = hits.get(key)
+        if hit is None:
+            pending.append(dev)
+            continue
+        records.extend(DeviceRecord._make(r) for r in hit["records"])
+        missing.extend(hit["incomplete"])
+        if not hit["received"]:
+            missing.append(dev)
+    return records, missing, pending
+
+
+def device_lookup(device_list, lookup_type, extra_headers, use_cache=True):
+    """
+    The device lookup engine behind /api/lookup, /api/lookup-stream and /api/export.
+    Yields event dicts, batches in completion order:
+
+        {'kind':'start', 'total', 'cached', 'total_batches', 'batch_size', 'records', 'missing'}   cache hits
+        {'kind':'batch', 'batch', 'total_batches', 'size', 'next_size', 'splits', 'records', 'missing'}
+        {'kind':'auth_error', 'status'}                         terminal
+
+    Batch sizes come from a BatchPlanner, so total_batches is an estimate that
+    settles as sizes adapt. A failed batch is split in half and retried rather
+    than reported missing. Records are DeviceRecord tuples. Closing the
+    generator cancels pending batches.
+    """
+    base_url  = BASE_URL_SERIAL if lookup_type == "serial" else BASE_URL_MAC
+    namespace = f"device.v2:{lookup_type}"
+    ident     = resultCache.identity(extra_headers)
+
+    records, missing, pending = _split_cached(device_list, namespace, ident, use_cache)
+    planner = BatchPlanner(pending, len(base_url.format(limit=BATCH_MAX, devices="")),
+                           size=BATCH_SIZE, min_size=BATCH_MIN, max_size=BATCH_MAX,
+                           target_latency=BATCH_TARGET_LATENCY, max_url_length=MAX_URL_LENGTH)
+
+    yield {'kind':'start','total':len(device_list),'cached':len(device_list) - len(pending),
+           'total_batches':(len(pending) + BATCH_SIZE - 1) // BATCH_SIZE,'batch_size':BATCH_SIZE,
+           'records':records,'missing':missing}
+    if not pending:
+        return
+
+    limiter  = AdaptiveRateLimiter(rate=RATE_START, burst=MAX_CONCURRENT_BATCHES,
+                                   min_rate=RATE_MIN, max_rate=RATE_MAX)
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES)
+    running  = {}   # future -> batch
+
+    def fill():
+        while planner and len(running) < MAX_CONCURRENT_BATCHES:
+            batch = planner.next_batch()
+            fut   = executor.submit(metrics.in_context(_fetch_batch), batch, base_url, lookup_type, extra_headers, limiter)
+            running[fut] = batch
+
+    try:
+        completed = 0
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                batch = running.pop(fut)
+                status, a, b, per_item, latency = fut.result()
+                if status == "auth_error":
+                    yield {'kind':'auth_error','status':a}
+                    return
+                if status == "error":
+                    if a and planner.on_failure(batch):
+                        metrics.log("device_batch_split", size=len(batch), next_size=planner.size)
+                        continue
+                    # Upstream down, single device, or failures back to back: report as missing, uncached
+                    a, b = [], list(batch)
+                else:
+                    planner.on_success(len(batch), latency)
+                    if per_item:
+                        received = {k: v for k, v in per_item.items() if v["received"]}
+                        unknown  = {k: v for k, v in per_item.items() if not v["received"]}
+                        resultCache.cache.set_many(namespace, ident, received)
+                        resultCache.cache.set_many(namespace, ident, unknown, negative=True)
+
+                completed += 1
+                total_batches = completed + len(running) + (planner.remaining() + planner.size - 1) // planner.size
+                metrics.log("device_batch", batch=completed, total_batches=total_batches, size=len(batch),
+                            next_size=planner.size, found=len(a), missing=len(b))
+                yield {'kind':'batch','batch':completed,'total_batches':total_batches,'size':len(batch),
+                       'next_size':planner.size,'splits':planner.splits,'records':a,'missing':b}
+            fill()
+    finally:
+        # Don't keep hammering the API for a lookup that errored or was abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def device_summary(total, found, missing_count):
+    return {
+        "total":         total,
+        "found":         found,
+        "missing_count": missing_count,
+        "found_pct":     round(found / total * 100, 1) if total else 0,
+        "missing_pct":   round(missing_count / total * 100, 1) if total else 0,
+    }
+
+
+def device_result(total, records, missing):
+    """Final payload shared by every adapter: sorted record dicts plus summary counts."""
+    devices = sorted_dicts(records)
+    return {**device_summary(total, len(devices), len(missing)), "devices": devices, "missing": missing}
+
+
+def run_device_lookup(device_list, lookup_type, extra_headers, use_cache=True):
+    """
+    Drain the engine for non-streaming callers.
+    Returns ('ok', sorted records, missing) or ('auth_error', status_code, None).
+    """
+    records, missing = [], []
+    for event in device_lookup(device_list, lookup_type, extra_headers, use_cache):
+        if event['kind'] == 'auth_error':
+            return ("auth_error", event['status'], None)
+        records.extend(event['records'])
+        missing.extend(event['missing'])
+    records.sort(key=sort_key)
+    return ("ok", records, missing)
@@ -1,9 +1,15 @@
-from flask import Flask, send_from_directory
+from flask import Flask, Response, send_from_directory, jsonify
 from flask_cors import CORS
 import os
 
 from deviceApp import device_bp
 from subscriptionApp import subscription_bp
+from jobApp import job_bp
+from uploadApp import upload_bp
+from reportApp import report_bp
+import metrics
+from resultCache import cache
+from responseCompression import compress_response
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -13,6 +19,22 @@ CORS(app)
 # ─── Register blueprints ──────────────────────────────────────────────────────
 app.register_blueprint(device_bp)
 app.register_blueprint(subscription_bp)
+app.register_blueprint(job_bp)
+app.register_blueprint(upload_bp)
+app.register_blueprint(report_bp)
+
+# ─── gzip/brotli for JSON, CSV and SSE responses ──────────────────────────────
+app.after_request(compress_response)
+
+# ─── Cache stats ──────────────────────────────────────────────────────────────
+@app.route('/api/cache-stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+# ─── Prometheus metrics ───────────────────────────────────────────────────────
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # ─── Serve frontend pages ─────────────────────────────────────────────────────
 @app.route('/')
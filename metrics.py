@@ -0,0 +1,210 @@
+import contextvars
+import functools
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+# Small in-process Prometheus registry; /metrics renders it in the text format.
+# Values are per process, which matches the single gunicorn worker we run.
+_registry = []
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_str(names, values, extra=""):
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name   = name
+        self.help   = help
+        self.labels = tuple(labels)
+        self._lock  = threading.Lock()
+        self._data  = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._data.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._data[key] = self._data.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+INF_LABEL = 'le="+Inf"'
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = [[0] * len(self.buckets), 0.0, 0]   # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._data.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {count}")
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# ─── Metrics ──────────────────────────────────────────────────────────────────
+UPSTREAM_SECONDS   = Histogram("greenlake_upstream_request_seconds", "Upstream HTTP request latency, per attempt.", ["endpoint"])
+UPSTREAM_RESPONSES = Counter("greenlake_upstream_responses_total", "Upstream responses by status code ('error' for connection failures).", ["endpoint", "status"])
+UPSTREAM_RETRIES   = Counter("greenlake_upstream_retries_total", "Upstream requests retried after a 429/5xx or connection error.", ["endpoint"])
+UPSTREAM_WAIT      = Histogram("greenlake_upstream_wait_seconds", "Time a request spent on the rate limiter, in-flight cap and backoff.", ["endpoint"])
+BATCH_SIZE         = Histogram("greenlake_device_batch_size", "Devices per activate-devices request.", [], (1, 10, 25, 50, 100, 200, 400, 800))
+CACHE_LOOKUPS      = Counter("greenlake_cache_lookups_total", "Result cache lookups.", ["namespace", "result"])
+ACTIVE_STREAMS     = Gauge("greenlake_active_streams", "SSE streams currently open.", ["stream"])
+ROWS_EMITTED       = Counter("greenlake_rows_emitted_total", "Result rows sent to clients.", ["stream"])
+LOOKUP_SECONDS     = Histogram("greenlake_lookup_seconds", "Wall time of a whole lookup, from first to last event.", ["stream", "outcome"])
+
+
+# ─── Correlation IDs and traces ───────────────────────────────────────────────
+class Trace:
+    """
+    Per-lookup accumulator. Worker threads add upstream time, waits and retries
+    so the closing log line shows where the lookup's time went.
+    """
+
+    def __init__(self, request_id, name):
+        self.id      = request_id
+        self.name    = name
+        self.started = time.perf_counter()
+        self.totals  = {"upstream_calls": 0, "upstream_seconds": 0.0, "waited_seconds": 0.0,
+                        "retries": 0, "cache_hits": 0, "rows": 0}
+        self._lock   = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.totals[name] += amount
+
+
+_current = contextvars.ContextVar("greenlake_trace", default=None)
+
+
+def new_request_id(incoming=None):
+    """Honour a caller-supplied X-Request-ID (sanitised, capped at 64 chars), otherwise mint one."""
+    incoming = re.sub(r"[^\w.:-]", "", incoming or "")[:64]
+    return incoming or uuid.uuid4().hex[:16]
+
+
+def current_id():
+    trace = _current.get()
+    return trace.id if trace else None
+
+
+def record(**amounts):
+    """Add to the active trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(**amounts)
+
+
+def in_context(fn):
+    """Carry the caller's trace into a thread-pool task: executor.submit(in_context(fn), ...)."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+_log_lock = threading.Lock()
+
+
+def log(event, **fields):
+    """One JSON log line, tagged with the active correlation ID."""
+    line = json.dumps({"ts": round(time.time(), 3), "request_id": current_id(), "event": event, **fields},
+                      default=str)
+    # One write per line under a lock, so lines from worker threads never interleave
+    with _log_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+@contextmanager
+def traced(request_id, name):
+    """
+    Make `request_id` the active trace for the block and log a summary line
+    when it ends. The yielded dict's 'outcome' is recorded on exit.
+    """
+    trace    = Trace(request_id, name)
+    previous = _current.get()
+    _current.set(trace)
+    state    = {"outcome": "aborted", "trace": trace}
+    try:
+        yield state
+    except Exception:
+        state["outcome"] = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - trace.started
+        LOOKUP_SECONDS.observe(elapsed, stream=name, outcome=state["outcome"])
+        totals = {k: round(v, 4) if isinstance(v, float) else v for k, v in trace.totals.items()}
+        log("lookup", name=name, outcome=state["outcome"], seconds=round(elapsed, 4), **totals)
+        # set() rather than reset(): a generator may be closed from another context
+        _current.set(previous)
+
+
+@contextmanager
+def span(event, **fields):
+    """Time a block and log it with its fields; the block may add fields to the yielded dict."""
+    t0 = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        log(event, ms=round((time.perf_counter() - t0) * 1000, 1), **fields)
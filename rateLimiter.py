@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to upstream health.
+    Healthy responses nudge the rate up additively; 429/5xx cut it
+    multiplicatively (AIMD), so we settle just under what the API tolerates.
+    """
+
+    def __init__(self, rate=2.0, burst=4, min_rate=0.5, max_rate=10.0,
+                 increase=0.25, decrease=0.5):
+        self.rate      = float(rate)
+        self.burst     = float(burst)
+        self.min_rate  = float(min_rate)
+        self.max_rate  = float(max_rate)
+        self.increase  = float(increase)
+        self.decrease  = float(decrease)
+        self._tokens   = float(burst)
+        self._last     = time.monotonic()
+        self._paused   = 0.0
+        self._lock     = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last   = now
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self._paused - now)
+                if not wait and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                if not wait:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """Back off after a 429/5xx; honour Retry-After (seconds) if the API sent one."""
+        with self._lock:
+            self.rate    = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused = max(self._paused, time.monotonic() + retry_after)
+
+
+def retry_after_seconds(response):
+    """Parse a numeric Retry-After header; HTTP-date values are ignored."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
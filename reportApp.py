@@ -0,0 +1,138 @@
+from flask import Blueprint, request, jsonify
+from collections import Counter
+
+from deviceApp import parse_device_input
+from lookupCore import AUTH_ERROR_MESSAGE, device_lookup
+from subscriptionApp import WORKSPACE_SUB_URL, fetch_keys
+from sseStream import event_stream
+
+report_bp = Blueprint('report', __name__)
+
+
+# ─── Join ─────────────────────────────────────────────────────────────────────
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def workspace_row(workspace, device_count, subscriptions, failed=False):
+    """
+    One report row: the devices found in a workspace against its
+    subscriptions. Seats and open seats count valid subscriptions only.
+    Only subscriptions that name this workspace are counted. A workspace
+    whose fetch failed, or whose pages showed the upstream ignoring the
+    platform_customer_id filter, is marked ERROR rather than uncovered.
+    """
+    subscriptions = [s for s in subscriptions if s.workspace == workspace]
+    valid = [s for s in subscriptions if s.status == "VALID"]
+    if failed:
+        status = "ERROR"
+    elif valid:
+        status = "OK"
+    elif subscriptions:
+        status = "NO VALID SUBSCRIPTION"
+    else:
+        status = "NO SUBSCRIPTIONS"
+    return {
+        "Workspace":     workspace,
+        "Devices":       device_count,
+        "Subscriptions": len(subscriptions),
+        "Valid":         len(valid),
+        "Expired":       len(subscriptions) - len(valid),
+        "Seats":         sum(_as_int(s.quantity) for s in valid),
+        "Open Seats":    sum(_as_int(s.open_seats) for s in valid),
+        "Status":        status,
+    }
+
+
+def report_summary(total_devices, found, missing_count, rows):
+    return {
+        "total":                total_devices,
+        "found":                found,
+        "missing_count":        missing_count,
+        "workspace_count":      len(rows),
+        "workspaces_ok":        sum(r["Status"] == "OK" for r in rows),
+        "workspaces_uncovered": sum(r["Status"] not in ("OK", "ERROR") for r in rows),
+        "workspaces_failed":    sum(r["Status"] == "ERROR" for r in rows),
+    }
+
+
+def report_events(inputs, lookup_type, parsed_headers, use_cache=True, mode="full"):
+    """
+    Device lookup, then every distinct workspace (platform_customer_id) the
+    found devices belong to is fetched once, all workspaces concurrently
+    through subscriptionApp.fetch_keys. Devices are counted per workspace in
+    a dict as batches arrive, so each workspace's row is ready the moment its
+    subscriptions are.
+
+    Progress events carry phase 'devices' then 'subscriptions'. mode="rows"
+    emits each workspace row as a 'rows' event and done carries only the
+    summary, with missing devices sent in 'rows' events during the device
+    phase; full mode puts the sorted rows and missing devices in done.
+    """
+    device_list   = inputs.items
+    total_devices = len(device_list)
+    per_workspace = Counter()
+    found, missing, queried = 0, [], 0
+
+    for event in device_lookup(device_list, lookup_type, parsed_headers, use_cache):
+        if event['kind'] == 'auth_error':
+            yield {'type':'auth_error','status':event['status'],'message':AUTH_ERROR_MESSAGE}
+            return
+        for record in event['records']:
+            per_workspace[record.platform_id] += 1
+        new_missing = [inputs.original(m) for m in event['missing']]
+        found   += len(event['records'])
+        queried += event['cached'] if event['kind'] == 'start' else event['size']
+        missing.extend(new_missing)
+        if mode == "rows" and new_missing:
+            yield {'type':'rows','workspaces':[],'missing':new_missing}
+        yield {'type':'progress','phase':'devices','pct':round(queried / total_devices * 100),
+               'queried':queried,'total':total_devices,'found':found}
+
+    workspaces = list(per_workspace)
+    rows, done = [], 0
+    for status, workspace, subscriptions, _ in fetch_keys(workspaces, parsed_headers, use_cache,
+                                                          WORKSPACE_SUB_URL, "workspace-subscription",
+                                                          match_field="platform_customer_id"):
+        if status == "auth_error":
+            yield {'type':'auth_error','status':workspace,'message':AUTH_ERROR_MESSAGE}
+            return
+        row = workspace_row(workspace, per_workspace[workspace], subscriptions, failed=status == "error")
+        rows.append(row)
+        done += 1
+        if mode == "rows":
+            yield {'type':'rows','workspaces':[row],'missing':[]}
+        yield {'type':'progress','phase':'subscriptions','pct':round(done / len(workspaces) * 100),
+               'queried':done,'total':len(workspaces)}
+
+    result = report_summary(total_devices, found, len(missing), rows)
+    result.update(inputs.report())
+    if mode != "rows":
+        # Workspaces needing attention first, biggest first
+        rows.sort(key=lambda r: (r["Status"] == "OK", -r["Devices"]))
+        result["workspaces"] = rows
+        result["missing"]    = missing
+    yield {'type':'done','data':result}
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+@report_bp.route("/api/report-stream", methods=["POST"])
+def report_stream():
+    """
+    Devices cross-referenced with their workspaces' subscriptions. Same body
+    as /api/lookup-stream: devices, type, parsed_headers, refresh, mode.
+    """
+    body           = request.get_json(force=True)
+    lookup_type    = body.get("type", "serial")
+    parsed_headers = body.get("parsed_headers", {}) or {}
+    use_cache      = not body.get("refresh", False)
+    mode           = body.get("mode", "full")
+
+    inputs = parse_device_input(body.get("devices", ""), lookup_type)
+    if not inputs.items:
+        return jsonify({"error": "No valid devices provided", **inputs.report()}), 400
+
+    return event_stream(report_events(inputs, lookup_type, parsed_headers, use_cache, mode), "report-stream")
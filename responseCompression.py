@@ -0,0 +1,80 @@
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli           # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+COMPRESSION_ENABLED = os.environ.get("RESPONSE_COMPRESSION", "1").lower() not in ("0", "false", "no")
+COMPRESS_MIN_BYTES  = 500      # smaller bodies aren't worth the header overhead
+GZIP_LEVEL          = 6
+BROTLI_QUALITY      = 5        # fast enough to run per SSE event
+COMPRESSIBLE        = {"application/json", "text/event-stream", "text/csv", "text/plain", "text/html"}
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def _compressor(encoding):
+    """(compress, flush, finish) callables for one response body."""
+    if encoding == "br":
+        c = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)     # wbits 31 = gzip container
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def _compressed_stream(chunks, encoding, close):
+    """
+    Compress a streamed body chunk by chunk. Each chunk is flushed so SSE
+    events still reach the client as they happen. The compression window
+    spans the whole stream, so keys repeated across events compress away.
+    """
+    compress, flush, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """after_request hook: gzip or brotli for JSON, CSV and SSE responses the client accepts."""
+    if (not COMPRESSION_ENABLED
+            or response.mimetype not in COMPRESSIBLE
+            or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        close = getattr(response.response, "close", None)
+        response.response = _compressed_stream(response.iter_encoded(), encoding, close)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        compress, _, finish = _compressor(encoding)
+        response.set_data(compress(body) + finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+CACHE_TTL       = float(os.environ.get("RESULT_CACHE_TTL", 3600))             # seconds; 0 disables
+# "Not found" answers expire sooner, so newly onboarded devices/keys show up on a re-run
+NEGATIVE_TTL    = float(os.environ.get("RESULT_CACHE_NEGATIVE_TTL", 60))
+CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_DB        = os.environ.get("RESULT_CACHE_DB", "")                       # SQLite path, opt-in
+
+def identity(headers):
+    """
+    Stable, non-reversible tenant identity derived from the caller's headers.
+    Every cache key is scoped by it so tenants never share entries. All
+    headers count, with names case-folded (HTTP header names are
+    case-insensitive), so "authorization" and "Authorization" both separate
+    tenants and no other header the upstream might authenticate on is ignored.
+    """
+    entries = sorted((str(name).casefold(), str(value)) for name, value in (headers or {}).items())
+    h = hashlib.sha256()
+    for name, value in entries:
+        h.update(name.encode())
+        h.update(b"\0")
+        h.update(value.encode())
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+class MemoryBackend:
+    """LRU dict bounded by an approximate byte budget (size of the JSON encoding)."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes     = 0
+        self.evictions = 0
+        self._data     = OrderedDict()   # key -> (expires, size, value)
+        self._lock     = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys, now):
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    self._drop(key)
+                    continue
+                self._data.move_to_end(key)
+                found[key] = entry[2]
+        return found
+
+    def set_many(self, items, expires):
+        with self._lock:
+            for key, value in items:
+                size = len(key) + len(json.dumps(value, separators=(",", ":")))
+                if key in self._data:
+                    self._drop(key)
+                self._data[key] = (expires, size, value)
+                self.bytes += size
+            while self.bytes > self.max_bytes and self._data:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.bytes -= self._data.pop(key)[1]
+
+
+class SqliteBackend:
+    """Same contract as MemoryBackend, persisted so entries survive gunicorn restarts."""
+
+    name = "sqlite"
+
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock     = threading.Lock()
+        self._conn     = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires REAL NOT NULL, used REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS result_cache_used ON result_cache(used)")
+        self._conn.execute("DELETE FROM result_cache WHERE expires < ?", (time.time(),))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+    @property
+    def bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+
+    def get_many(self, keys, now):
+        found = {}
+        keys  = list(keys)
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i: i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows  = self._conn.execute(
+                    f"SELECT key, value FROM result_cache WHERE key IN ({marks}) AND expires >= ?",
+                    (*chunk, now),
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+            if found:
+                self._conn.executemany("UPDATE result_cache SET used = ? WHERE key = ?",
+                                       [(now, k) for k in found])
+        return found
+
+    def set_many(self, items, expires):
+        now  = time.time()
+        rows = []
+        for key, value in items:
+            encoded = json.dumps(value, separators=(",", ":"))
+            rows.append((key, encoded, expires, now, len(key) + len(encoded)))
+        with self._lock:
+            evicted = 0
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("DELETE FROM result_cache WHERE expires < ?", (now,))
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+                # Walk the LRU end a chunk at a time until we're back under budget
+                while total > self.max_bytes:
+                    oldest = self._conn.execute(
+                        "SELECT key, size FROM result_cache ORDER BY used LIMIT 100").fetchall()
+                    if not oldest:
+                        break
+                    for key, size in oldest:
+                        self._conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                        evicted += 1
+                        total   -= size
+                        if total <= self.max_bytes:
+                            break
+                self._conn.execute("COMMIT")
+                self.evictions += evicted
+            except BaseException:
+                # Leave the connection usable: a dangling transaction fails every later BEGIN
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+
+
+class ResultCache:
+    """
+    Per-item lookup cache. Keys are (namespace, tenant identity, item), so a
+    repeat run only sends the misses upstream.
+    """
+
+    def __init__(self, backend, ttl, negative_ttl=None):
+        self.backend      = backend
+        self.ttl          = ttl
+        self.negative_ttl = ttl if negative_ttl is None else min(ttl, negative_ttl)
+        self.hits    = 0
+        self.misses  = 0
+        self._lock   = threading.Lock()
+
+    @staticmethod
+    def _key(namespace, ident, item):
+        return f"{namespace}|{ident}|{item}"
+
+    def get_many(self, namespace, ident, items):
+        """Returns ({item: value} for hits, [items] that missed), preserving input order."""
+        if self.ttl <= 0:
+            return {}, list(items)
+        keys  = {self._key(namespace, ident, item): item for item in items}
+        found = self.backend.get_many(keys, time.time())
+        hits  = {keys[k]: v for k, v in found.items()}
+        misses = [item for item in items if item not in hits]
+        with self._lock:
+            self.hits   += len(hits)
+            self.misses += len(misses)
+        metrics.CACHE_LOOKUPS.inc(len(hits), namespace=namespace, result="hit")
+        metrics.CACHE_LOOKUPS.inc(len(misses), namespace=namespace, result="miss")
+        metrics.record(cache_hits=len(hits))
+        return hits, misses
+
+    def get(self, namespace, ident, item):
+        hits, _ = self.get_many(namespace, ident, [item])
+        return hits.get(item)
+
+    def set_many(self, namespace, ident, mapping, negative=False):
+        """Store results; negative=True marks "not found" answers, kept for negative_ttl only."""
+        ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0 or not mapping:
+            return
+        try:
+            self.backend.set_many(
+                [(self._key(namespace, ident, item), value) for item, value in mapping.items()],
+                time.time() + ttl,
+            )
+        except sqlite3.Error as e:
+            # A locked or full cache database costs the next run a miss, not this lookup
+            metrics.log("result_cache_error", backend=self.backend.name, error=str(e))
+
+    def set(self, namespace, ident, item, value, negative=False):
+        self.set_many(namespace, ident, {item: value}, negative)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend":      self.backend.name,
+            "hits":         self.hits,
+            "misses":       self.misses,
+            "hit_rate":     round(self.hits / total * 100, 1) if total else 0,
+            "entries":      len(self.backend),
+            "bytes":        self.backend.bytes,
+            "max_bytes":    self.backend.max_bytes,
+            "evictions":    self.backend.evictions,
+            "ttl":          self.ttl,
+            "negative_ttl": self.negative_ttl,
+        }
+
+
+if CACHE_DB:
+    cache = ResultCache(SqliteBackend(CACHE_DB, CACHE_MAX_BYTES), CACHE_TTL, NEGATIVE_TTL)
+else:
+    cache = ResultCache(MemoryBackend(CACHE_MAX_BYTES), CACHE_TTL, NEGATIVE_TTL)
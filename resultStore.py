@@ -0,0 +1,33 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+RESULT_STORE_MAX = int(os.environ.get("RESULT_STORE_MAX", 20))        # completed lookups kept
+RESULT_STORE_TTL = float(os.environ.get("RESULT_STORE_TTL", 3600))    # seconds
+
+_results = OrderedDict()   # result_id -> (expires, result)
+_lock    = threading.Lock()
+
+
+def put(result):
+    """Keep a finished lookup result so exports can reuse it. Returns its result_id."""
+    result_id = uuid.uuid4().hex
+    now       = time.time()
+    with _lock:
+        _results[result_id] = (now + RESULT_STORE_TTL, result)
+        for rid in [rid for rid, (expires, _) in _results.items() if expires < now]:
+            del _results[rid]
+        while len(_results) > RESULT_STORE_MAX:
+            _results.popitem(last=False)
+    return result_id
+
+
+def get(result_id):
+    with _lock:
+        entry = _results.get(result_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
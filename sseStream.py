@@ -0,0 +1,49 @@
+import json
+
+from flask import Response, request
+
+import metrics
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_event(event, event_id=None):
+    """Serialise one event dict as an SSE frame; event_id enables Last-Event-ID resume."""
+    frame = f"data: {json.dumps(event)}\n\n"
+    return f"id: {event_id}\n{frame}" if event_id is not None else frame
+
+
+def row_count(event):
+    """Result rows carried by a 'rows' event or a full-mode 'done' event."""
+    source = event.get("data", {}) if event.get("type") == "done" else event
+    rows   = source.get("devices") or source.get("subscriptions") or source.get("workspaces") or []
+    return len(rows) if event.get("type") in ("rows", "done") else 0
+
+
+def traced_events(events, request_id, stream):
+    """
+    Run an event generator under a trace: stamps request_id on every event,
+    tracks active streams and rows emitted, and logs a summary when it ends.
+    """
+    with metrics.traced(request_id, stream) as state:
+        metrics.ACTIVE_STREAMS.inc(stream=stream)
+        try:
+            for ev in events:
+                ev["request_id"] = request_id
+                rows = row_count(ev)
+                if rows:
+                    metrics.ROWS_EMITTED.inc(rows, stream=stream)
+                    metrics.record(rows=rows)
+                if ev["type"] in ("done", "auth_error", "error"):
+                    state["outcome"] = ev["type"]
+                yield ev
+        finally:
+            metrics.ACTIVE_STREAMS.dec(stream=stream)
+
+
+def event_stream(events, stream):
+    """Wrap a generator of event dicts as a text/event-stream response, traced under X-Request-ID."""
+    request_id = metrics.new_request_id(request.headers.get("X-Request-ID"))
+    return Response((format_event(ev) for ev in traced_events(events, request_id, stream)),
+                    mimetype="text/event-stream",
+                    headers={**SSE_HEADERS, "X-Request-ID": request_id})
@@ -1,86 +1,251 @@
-from flask import Blueprint, request, jsonify, Response
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
-import json
-import time
-import re
+
+import metrics
+import resultCache
+import upstreamClient
+from inputNormalizer import normalize
+from sseStream import event_stream
+from subscriptionRecords import COLUMNS, EpochDates, SubscriptionRecord, transform_subscriptions, workspace_key
+from wireFormat import encode_events
 
 SUB_URL = (
-    "https://aquila-user-api.common.cloud.hpe.com"
+    upstreamClient.BASE_URL +
     "/support-assistant/v1alpha1/subscriptions"
     "?limit={limit}&offset={offset}&subscription_key_pattern={key}"
 )
+# Every subscription of one workspace (used by the combined device/subscription report)
+WORKSPACE_SUB_URL = (
+    upstreamClient.BASE_URL +
+    "/support-assistant/v1alpha1/subscriptions"
+    "?limit={limit}&offset={offset}&platform_customer_id={key}"
+)
 # API often returns max 30 per page; we paginate to get all
 PAGE_SIZE = 30
-TIMEOUT = 10
-# How many keys to fetch in parallel (tune if API throttles)
-MAX_CONCURRENT_KEYS = 8
+# Upstream requests in flight per lookup, shared by all keys and pages (tune if API throttles)
+MAX_CONCURRENT_REQUESTS = 8
+# Offsets of one key fetched ahead once its first page comes back full
+SPECULATIVE_PAGES = 4
+
+DICT_COLUMNS = ('Key Description', 'Type', 'Start Date', 'End Date', 'Valid/Expired', 'Product SKU',
+                'EndUser Name', 'Workspace')
 
 subscription_bp = Blueprint('subscription', __name__)
 
 
-def _fetch_one_key(key, parsed_headers):
-    """Fetch all pages for one key. Returns ('ok', key, results, missing) or ('auth_error', status_code, None, None)."""
+def _fetch_page(key, offset, parsed_headers, url_template=SUB_URL):
+    """One page of one key. Returns ('ok', subscriptions), ('auth_error', status_code) or ('error', None)."""
+    url = url_template.format(limit=PAGE_SIZE, offset=offset, key=key)
     try:
-        all_subs_for_key = []
-        offset = 0
-        while True:
-            url = SUB_URL.format(limit=PAGE_SIZE, offset=offset, key=key)
-            response = requests.get(url, headers=parsed_headers, timeout=TIMEOUT)
-            response.raise_for_status()
-            data = response.json()
-            subscriptions = data.get("subscriptions", [])
-            all_subs_for_key.extend(subscriptions)
-            if len(subscriptions) < PAGE_SIZE:
-                break
-            offset += PAGE_SIZE
-            time.sleep(0.05)
-
-        results = []
-        missing_for_key = []
-        if not all_subs_for_key:
-            missing_for_key.append(key)
-        else:
-            for sub in all_subs_for_key:
-                appointments = sub.get("appointments", {})
-                start_epoch = appointments.get("subscription_start")
-                end_epoch = appointments.get("subscription_end")
-                start_str = datetime.utcfromtimestamp(start_epoch / 1000).strftime("%Y-%m-%d") if start_epoch else ""
-                end_str = datetime.utcfromtimestamp(end_epoch / 1000).strftime("%Y-%m-%d") if end_epoch else ""
-                eval_type = sub.get("evaluation_type", "")
-                if eval_type == "NONE":
-                    eval_type = "PAID"
-                is_valid = (
-                    end_epoch
-                    and datetime.utcnow().date() <= datetime.utcfromtimestamp(end_epoch / 1000).date()
-                )
-                status = "VALID" if is_valid else "EXPIRED"
-                sub_key = sub.get("subscription_key")
-                quote = sub.get("quote")
-                if sub_key and quote:
-                    results.append({
-                        "Subscription Key": sub_key,
-                        "Key Description": sub.get("product_description", ""),
-                        "Type": eval_type,
-                        "Quantity": sub.get("quantity", ""),
-                        "Open Seats": sub.get("available_quantity", ""),
-                        "Start Date": start_str,
-                        "End Date": end_str,
-                        "Valid/Expired": status,
-                        "Order ID": quote,
-                        "Product SKU": sub.get("product_sku", ""),
-                        "EndUser Name": sub.get("end_user_name", ""),
-                        "Workspace": sub.get("platform_customer_id", ""),
-                    })
-                else:
-                    missing_for_key.append(sub_key or key)
-        return ("ok", key, results, missing_for_key)
+        response = upstreamClient.get(url, headers=parsed_headers)
+        response.raise_for_status()
+        return ("ok", response.json().get("subscriptions", []))
     except requests.exceptions.RequestException as e:
         status_code = getattr(getattr(e, "response", None), "status_code", None)
         if status_code in (401, 403):
-            return ("auth_error", status_code, None, None)
-        return ("ok", key, [], [key])
+            return ("auth_error", status_code)
+        metrics.log("subscription_page_error", key=key, offset=offset, error=str(e))
+        return ("error", None)
+
+
+class _KeyPages:
+    """Paging state for one key: fetched pages, the next offset to issue, and where it ends."""
+
+    def __init__(self):
+        self.pages       = {}      # offset -> subscriptions
+        self.futures     = {}      # offset -> in-flight future
+        self.next_offset = 0
+        self.end         = None    # offset of the first short page
+        self.failed      = set()   # offsets whose page failed
+        self.rejected    = False   # a page held another key's subscriptions
+
+    def finished(self):
+        return not self.futures and (self.rejected or self.failed or self.end is not None)
+
+    def lost(self):
+        """
+        True once the key was rejected or a failed page is known to lie before
+        the end: the end is past it, or a later page came back full. A failed
+        speculative page past the end costs nothing.
+        """
+        last = self.end if self.end is not None else max(self.pages, default=-1)
+        return self.rejected or any(offset < last for offset in self.failed)
+
+    def complete(self):
+        """Every page up to the end arrived. With the end unknown a failure can't be ruled out."""
+        return self.end is not None and not self.lost()
+
+    def collect(self):
+        subs = []
+        for offset in range(0, self.end + PAGE_SIZE, PAGE_SIZE):
+            subs.extend(self.pages[offset])
+        return subs
+
+
+def fetch_keys(keys, parsed_headers, use_cache=True, url_template=SUB_URL, namespace="subscription.v2",
+               match_field=None):
+    """
+    Fetch every key, yielding ('ok', key, records, missing) per key as it
+    completes, or a single terminal ('auth_error', status_code, None, None).
+    A key with a failed page before its end comes back as ('error', key, [], [key]).
+    Records are SubscriptionRecord tuples, dated against one "today".
+    Keys are subscription key patterns by default; pass WORKSPACE_SUB_URL
+    (and its own cache namespace) to fetch by workspace instead.
+    With match_field set, a page holding a subscription whose match_field
+    isn't the key means upstream ignored the filter: the key stops there as
+    an error instead of paging through every subscription.
+
+    All keys and pages share one pool of MAX_CONCURRENT_REQUESTS workers.
+    Each key starts with its first page. Once a page comes back full, up to
+    SPECULATIVE_PAGES further offsets of that key are kept in flight until a
+    short page marks the end. Wide inputs fill the pool with first pages and
+    deep keys fill it with their own pages.
+    """
+    ident   = resultCache.identity(parsed_headers)
+    pending = list(keys)
+    if use_cache:
+        hits, pending = resultCache.cache.get_many(namespace, ident, pending)
+        for key, hit in hits.items():
+            yield ("ok", key, [SubscriptionRecord._make(r) for r in hit["results"]], hit["missing"])
+    if not pending:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+    dates    = EpochDates()
+    states   = {key: _KeyPages() for key in pending}
+    running  = {}   # future -> (key, offset)
+
+    def submit(key, depth):
+        st = states[key]
+        while len(st.futures) < depth:
+            fut = executor.submit(metrics.in_context(_fetch_page), key, st.next_offset, parsed_headers, url_template)
+            st.futures[st.next_offset] = fut
+            running[fut] = (key, st.next_offset)
+            st.next_offset += PAGE_SIZE
+
+    try:
+        for key in pending:
+            submit(key, 1)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                key, offset = running.pop(fut)
+                st = states[key]
+                del st.futures[offset]
+
+                if not fut.cancelled():
+                    status, subs = fut.result()
+                    if status == "auth_error":
+                        yield ("auth_error", subs, None, None)
+                        return
+                    if status == "error":
+                        st.failed.add(offset)
+                    elif match_field and any(sub.get(match_field) != key for sub in subs):
+                        metrics.log("subscription_filter_ignored", key=key, offset=offset, field=match_field)
+                        st.rejected = True
+                    else:
+                        st.pages[offset] = subs
+                        if len(subs) < PAGE_SIZE and (st.end is None or offset < st.end):
+                            st.end = offset
+
+                    if st.lost():
+                        for spec in st.futures.values():
+                            spec.cancel()
+                    elif st.end is not None:
+                        # Pages past the end can't return anything; drop the ones not started yet
+                        for spec_offset, spec in list(st.futures.items()):
+                            if spec_offset > st.end:
+                                spec.cancel()
+                    elif not st.failed:
+                        submit(key, SPECULATIVE_PAGES)
+                    # After a failure with the end unknown, only the pages in flight can still place it
+
+                if st.finished():
+                    del states[key]
+                    if not st.complete():
+                        yield ("error", key, [], [key])
+                        continue
+                    with metrics.span("subscription_transform", key=key) as fields:
+                        subs = st.collect()
+                        results, missing_for_key = transform_subscriptions(key, subs, dates)
+                        fields.update(subscriptions=len(subs), rows=len(results))
+                    resultCache.cache.set(namespace, ident, key, {"results": results, "missing": missing_for_key},
+                                          negative=not results)
+                    yield ("ok", key, results, missing_for_key)
+    finally:
+        # Don't keep hammering the API for a stream that errored or was abandoned
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_key_input(raw_keys):
+    """Canonical, de-duplicated subscription keys plus the invalid entries; see inputNormalizer."""
+    return normalize(raw_keys, "subscription")
+
+
+def subscription_summary(valid_count, expired_count, missing_count):
+    total = valid_count + expired_count + missing_count
+    return {
+        "total":         total,
+        "valid":         valid_count,
+        "expired":       expired_count,
+        "missing_count": missing_count,
+        "valid_pct":     round(valid_count   / total * 100, 1) if total else 0,
+        "expired_pct":   round(expired_count / total * 100, 1) if total else 0,
+        "missing_pct":   round(missing_count / total * 100, 1) if total else 0,
+    }
+
+
+def subscription_events(inputs, parsed_headers, use_cache=True, mode="full"):
+    """
+    Streaming subscription lookup for a NormalizedInput, as a generator of event
+    dicts (progress, auth_error, done). Subscriptions are deduplicated on the fly
+    as keys finish; missing keys are reported as originally pasted. mode="rows"
+    emits each key's new rows as a 'rows' event; done then carries only summary counts.
+    """
+    keys        = inputs.items
+    total_keys  = len(keys)
+    stream_rows = mode == "rows"
+    deduped, missing_keys = [], []
+    seen, seen_missing    = set(), set()
+    valid_count = 0
+
+    completed = 0
+    for status, a, res_list, miss_list in fetch_keys(keys, parsed_headers, use_cache):
+        if status == "auth_error":
+            yield {'type':'auth_error','status':a,'message':'Authentication failed — your Authorization/Cookie headers are expired or invalid. Please update and retry.'}
+            return
+
+        new_rows = []
+        for r in res_list:
+            if r.subscription_key not in seen:
+                seen.add(r.subscription_key)
+                new_rows.append(r)
+                valid_count += r.status == "VALID"
+        new_missing = []
+        for k in miss_list:
+            if k not in seen_missing:
+                seen_missing.add(k)
+                new_missing.append(inputs.original(k))
+        deduped.extend(new_rows)
+        missing_keys.extend(new_missing)
+
+        if stream_rows and (new_rows or new_missing):
+            yield {'type':'rows','subscriptions':[r.as_dict() for r in new_rows],'missing':new_missing}
+        completed += 1
+        pct = round(completed / total_keys * 100)
+        yield {'type':'progress','pct':pct,'queried':completed,'total':total_keys}
+
+    result = subscription_summary(valid_count, len(deduped) - valid_count, len(missing_keys))
+    result.update(inputs.report())
+    if not stream_rows:
+        deduped.sort(key=workspace_key)
+        result["subscriptions"] = [r.as_dict() for r in deduped]
+        result["missing"]       = missing_keys
+
+    yield {'type':'progress','pct':100,'queried':total_keys,'total':total_keys}
+    yield {'type':'done','data':result}
 
 
 # ─── Routes ───────────────────────────────────────────────────────────────────
@@ -89,66 +254,16 @@ def subscription_stream():
     body           = request.get_json(force=True)
     raw_keys       = body.get("keys", "")
     parsed_headers = body.get("parsed_headers", {})
+    use_cache      = not body.get("refresh", False)
+    mode           = body.get("mode", "full")
 
-    keys = list(set([
-        k.strip() for k in re.split(r"[,\n]+", raw_keys)
-        if k.strip()
-    ]))
+    inputs = parse_key_input(raw_keys)
 
-    if not keys:
+    if not inputs.items:
+        if inputs.invalid:
+            return jsonify({"error": "No valid subscription keys provided.", **inputs.report()}), 400
         return jsonify({"error": "No subscription keys provided."}), 400
 
-    def generate():
-        total_keys = len(keys)
-        results = []
-        missing_keys = []
-
-        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_KEYS) as executor:
-            futures = {executor.submit(_fetch_one_key, key, parsed_headers): key for key in keys}
-            completed = 0
-            for fut in as_completed(futures):
-                status, a, res_list, miss_list = fut.result()
-                if status == "auth_error":
-                    yield f"data: {json.dumps({'type':'auth_error','status':a,'message':'Authentication failed — your Authorization/Cookie headers are expired or invalid. Please update and retry.'})}\n\n"
-                    return
-                results.extend(res_list)
-                missing_keys.extend(miss_list)
-                completed += 1
-                pct = round(completed / total_keys * 100)
-                yield f"data: {json.dumps({'type':'progress','pct':pct,'queried':completed,'total':total_keys})}\n\n"
-
-        # ── Deduplicate ───────────────────────────────────────────────
-        seen, deduped = set(), []
-        for r in results:
-            k = r["Subscription Key"]
-            if k not in seen:
-                seen.add(k)
-                deduped.append(r)
-
-        missing_keys = list(set(missing_keys))
-
-        # Sort by Workspace
-        deduped.sort(key=lambda r: (r.get("Workspace") or "").lower())
-
-        valid_count   = sum(1 for r in deduped if r["Valid/Expired"] == "VALID")
-        expired_count = sum(1 for r in deduped if r["Valid/Expired"] == "EXPIRED")
-        missing_count = len(missing_keys)
-        total         = valid_count + expired_count + missing_count
-
-        result = {
-            "total":         total,
-            "valid":         valid_count,
-            "expired":       expired_count,
-            "missing_count": missing_count,
-            "valid_pct":     round(valid_count   / total * 100, 1) if total else 0,
-            "expired_pct":   round(expired_count / total * 100, 1) if total else 0,
-            "missing_pct":   round(missing_count / total * 100, 1) if total else 0,
-            "subscriptions": deduped,
-            "missing":       missing_keys,
-        }
-
-        yield f"data: {json.dumps({'type':'progress','pct':100,'queried':total_keys,'total':total_keys})}\n\n"
-        yield f"data: {json.dumps({'type':'done','data':result})}\n\n"
-
-    return Response(generate(), mimetype="text/event-stream",
-                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
\ No newline at end of file
+    events = subscription_events(inputs, parsed_headers, use_cache, mode)
+    events = encode_events(events, "subscriptions", COLUMNS, DICT_COLUMNS, body.get("encoding"))
+    return event_stream(events, "subscription-stream")
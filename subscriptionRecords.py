@@ -0,0 +1,94 @@
+import time
+from datetime import date, timedelta
+from typing import NamedTuple
+
+# Display column names, in the order the UI and exports use them
+COLUMNS = ('Subscription Key', 'Key Description', 'Type', 'Quantity', 'Open Seats', 'Start Date',
+           'End Date', 'Valid/Expired', 'Order ID', 'Product SKU', 'EndUser Name', 'Workspace')
+
+DAY_MS = 86_400_000
+EPOCH  = date(1970, 1, 1)
+
+
+class SubscriptionRecord(NamedTuple):
+    """
+    One subscription row. Tuple-backed like DeviceRecord: results stay
+    compact until they are serialised at the edge with as_dict().
+    """
+    subscription_key: str
+    key_description:  str
+    type:             str
+    quantity:         object
+    open_seats:       object
+    start_date:       str
+    end_date:         str
+    status:           str      # VALID / EXPIRED
+    order_id:         str
+    product_sku:      str
+    end_user_name:    str
+    workspace:        str
+
+    def as_dict(self):
+        return dict(zip(COLUMNS, self))
+
+
+class EpochDates:
+    """
+    Epoch-millisecond -> UTC date conversions for one request. "Today" is
+    fixed once, so every row is judged against the same day. Dates are
+    memoised per day number; subscriptions share a handful of start and
+    end days, so most rows are a dict hit instead of a datetime round-trip.
+    """
+
+    def __init__(self, now=None):
+        self.today  = int((time.time() if now is None else now) * 1000) // DAY_MS
+        self._names = {}
+
+    def name(self, day):
+        text = self._names.get(day)
+        if text is None:
+            text = self._names[day] = (EPOCH + timedelta(days=day)).isoformat()
+        return text
+
+
+def transform_subscriptions(key, subs, dates):
+    """
+    Turn one key's raw subscriptions into (records, missing keys), in one pass.
+    A subscription is VALID while its end date (UTC) is today or later.
+    """
+    if not subs:
+        return [], [key]
+
+    records, missing = [], []
+    today, name = dates.today, dates.name
+    for sub in subs:
+        sub_key = sub.get("subscription_key")
+        quote   = sub.get("quote")
+        if not (sub_key and quote):
+            missing.append(sub_key or key)
+            continue
+        appointments = sub.get("appointments", {})
+        start_epoch  = appointments.get("subscription_start")
+        end_epoch    = appointments.get("subscription_end")
+        end_day      = int(end_epoch // DAY_MS) if end_epoch else None
+        eval_type    = sub.get("evaluation_type", "")
+        records.append(SubscriptionRecord(
+            sub_key,
+            sub.get("product_description", ""),
+            "PAID" if eval_type == "NONE" else eval_type,
+            sub.get("quantity", ""),
+            sub.get("available_quantity", ""),
+            name(int(start_epoch // DAY_MS)) if start_epoch else "",
+            name(end_day) if end_day is not None else "",
+            "VALID" if end_day is not None and end_day >= today else "EXPIRED",
+            quote,
+            sub.get("product_sku", ""),
+            sub.get("end_user_name", ""),
+            sub.get("platform_customer_id", ""),
+        ))
+    return records, missing
+
+
+def workspace_key(record):
+    """Case-insensitive Workspace order, as the UI sorts."""
+    return (record.workspace or "").lower()
@@ -0,0 +1,34 @@
+"""
+Contract tests run the real app against benchmarks/mock_upstream.py.
+
+The upstream URL is read when the app modules are imported, so the mock is
+started and the environment set here, before anything imports main.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import mock_upstream  # noqa: E402
+
+UPSTREAM = mock_upstream.serve(latency=1.0, jitter=0.0)
+os.environ["UPSTREAM_BASE_URL"] = UPSTREAM.url
+os.environ["RESULT_CACHE_TTL"]  = "0"        # every request does the full upstream work
+
+from main import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def sse_events(response):
+    """Decode a text/event-stream body into its event dicts."""
+    body = response.get_data(as_text=True)
+    return [json.loads(line[5:]) for line in body.split("\n") if line.startswith("data:")]
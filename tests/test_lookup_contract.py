@@ -0,0 +1,100 @@
+"""
+/api/lookup, /api/lookup-stream (full and rows) and /api/export are adapters
+over one lookup engine; for the same input they must agree on what was found
+and what is missing, and report expired/forbidden credentials the same way.
+"""
+import csv
+import io
+
+import pytest
+
+from conftest import sse_events
+
+HEADERS  = {"Authorization": "Bearer contract", "Cookie": "session=contract"}
+SERIALS  = [f"CN{i:08d}" for i in range(450)]
+MACS     = [f"AA:BB:CC:DD:{i >> 8:02X}:{i & 255:02X}" for i in range(450)]
+INPUTS   = {"serial": SERIALS, "mac": MACS}
+ID_FIELD = {"serial": "Serial Number", "mac": "MAC Address"}
+
+
+def _body(lookup_type, headers=HEADERS, **extra):
+    return {"devices": ",".join(INPUTS[lookup_type]), "type": lookup_type, "parsed_headers": headers, **extra}
+
+
+def _found(rows, lookup_type):
+    return {r[ID_FIELD[lookup_type]].upper() for r in rows}
+
+
+def _csv_rows(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+@pytest.fixture(params=["serial", "mac"])
+def lookup_type(request):
+    return request.param
+
+
+@pytest.fixture
+def reference(client, lookup_type):
+    response = client.post("/api/lookup", json=_body(lookup_type))
+    assert response.status_code == 200
+    data = response.get_json()
+    return _found(data["devices"], lookup_type), set(data["missing"])
+
+
+def test_lookup_splits_every_input(reference, lookup_type):
+    found, missing = reference
+    assert found and missing, "the mock should know most IDs but not all"
+    assert found | missing == set(INPUTS[lookup_type])
+    assert not found & missing
+
+
+def test_stream_full_mode_matches_lookup(client, reference, lookup_type):
+    events = sse_events(client.post("/api/lookup-stream", json=_body(lookup_type)))
+    assert events[-1]["type"] == "done"
+    data = events[-1]["data"]
+    assert (_found(data["devices"], lookup_type), set(data["missing"])) == reference
+    assert data["found"] == len(reference[0]) and data["missing_count"] == len(reference[1])
+
+
+def test_stream_rows_mode_matches_lookup(client, reference, lookup_type):
+    events = sse_events(client.post("/api/lookup-stream", json=_body(lookup_type, mode="rows")))
+    rows   = [e for e in events if e["type"] == "rows"]
+    found  = _found([d for e in rows for d in e["devices"]], lookup_type)
+    missing = {m for e in rows for m in e["missing"]}
+    assert (found, missing) == reference
+    done = events[-1]
+    assert done["type"] == "done" and "devices" not in done["data"]
+    assert done["data"]["found"] == len(found) and done["data"]["missing_count"] == len(missing)
+
+
+def test_export_matches_lookup(client, reference, lookup_type):
+    found_csv   = _csv_rows(client.post("/api/export", json=_body(lookup_type, export="found")))
+    missing_csv = _csv_rows(client.post("/api/export", json=_body(lookup_type, export="missing")))
+    assert _found(found_csv, lookup_type) == reference[0]
+    assert {r["Missing Device"] for r in missing_csv} == reference[1]
+
+
+def test_export_of_stored_result_matches_stream(client, reference, lookup_type):
+    events    = sse_events(client.post("/api/lookup-stream", json=_body(lookup_type, mode="rows")))
+    result_id = events[-1]["result_id"]
+    found_csv = _csv_rows(client.post("/api/export", json={"result_id": result_id, "export": "found"}))
+    assert _found(found_csv, lookup_type) == reference[0]
+
+
+@pytest.mark.parametrize("token, status", [("Bearer expired", 401), ("Bearer forbidden", 403)])
+def test_auth_errors_are_reported_by_every_adapter(client, token, status):
+    headers = {"Authorization": token}
+
+    response = client.post("/api/lookup", json=_body("serial", headers))
+    assert response.status_code == status
+    assert response.get_json()["auth_error"] is True
+
+    for mode in ("full", "rows"):
+        events = sse_events(client.post("/api/lookup-stream", json=_body("serial", headers, mode=mode)))
+        assert events[-1]["type"] == "auth_error"
+        assert events[-1]["status"] == status
+
+    response = client.post("/api/export", json=_body("serial", headers))
+    assert response.status_code == status
+    assert response.get_json()["auth_error"] is True
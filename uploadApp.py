@@ -0,0 +1,179 @@
+from flask import Blueprint, request, jsonify
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import deviceApp
+import deviceRecords
+import subscriptionApp
+import subscriptionRecords
+from inputNormalizer import Normalizer, tokens
+from sseStream import event_stream
+from wireFormat import encode_events
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 64 * 1024 * 1024))
+PARSE_CHUNK_ROWS = 5000    # rows normalised per step; a 'parsing' event follows each
+SPOOL_MEMORY     = 4 * 1024 * 1024   # uploads beyond this are parsed from a temp file on disk
+FORMATS          = {".csv": "csv", ".txt": "txt", ".xlsx": "xlsx"}
+
+# Header cells that identify the ID column, per normaliser kind
+HEADER_ALIASES = {
+    "serial":       {"serial number", "serial", "serial_number", "serial no", "sn"},
+    "mac":          {"mac address", "mac", "mac_address"},
+    "subscription": {"subscription key", "subscription", "subscription_key", "key"},
+}
+
+upload_bp = Blueprint('upload', __name__)
+
+
+# ─── File readers (each yields rows as lists of strings) ─────────────────────
+def _rows_csv(stream):
+    yield from csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=""))
+
+
+def _rows_txt(stream):
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace"):
+        yield [line]
+
+
+def _rows_xlsx(stream):
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet XML row by row instead of building the whole workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield ["" if v is None else str(v) for v in row]
+    finally:
+        wb.close()
+
+
+READERS = {"csv": _rows_csv, "txt": _rows_txt, "xlsx": _rows_xlsx}
+
+
+def _column_cells(rows, kind, column=None):
+    """
+    Yield the ID column's cells. `column` picks it by header name or 1-based
+    number; otherwise a header matching HEADER_ALIASES is used, falling back
+    to the first column. A matched header row is skipped; anything else that
+    isn't an ID is rejected later by the normaliser.
+    """
+    rows  = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    names = [c.strip().lower() for c in first]
+
+    if column and column.isdigit():
+        if int(column) < 1:
+            raise ValueError("Column numbers start at 1.")
+        idx, header = int(column) - 1, False
+    elif column:
+        if column.strip().lower() not in names:
+            raise ValueError(f"Column '{column}' not found in the file's first row.")
+        idx, header = names.index(column.strip().lower()), True
+    else:
+        matches = [i for i, n in enumerate(names) if n in HEADER_ALIASES[kind]]
+        idx, header = (matches[0], True) if matches else (0, False)
+
+    if not header and idx < len(first):
+        yield first[idx]
+    for row in rows:
+        if idx < len(row):
+            yield row[idx]
+
+
+def _chunks(cells, size):
+    chunk = []
+    for cell in cells:
+        chunk.append(cell)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def upload_events(stream, file_format, kind, lookup_type, parsed_headers, use_cache, mode, column):
+    """
+    Parse an uploaded file chunk by chunk into a Normalizer, reporting
+    'parsing' events, then hand the normalised input to the regular
+    device or subscription event pipeline.
+    """
+    norm_kind  = "subscription" if kind == "subscription" else ("mac" if lookup_type == "mac" else "serial")
+    normalizer = Normalizer(norm_kind)
+    rows       = 0
+    try:
+        cells = _column_cells(READERS[file_format](stream), norm_kind, column)
+        for chunk in _chunks(cells, PARSE_CHUNK_ROWS):
+            normalizer.feed(tokens(chunk))
+            rows += len(chunk)
+            yield {'type':'parsing','rows':rows,'unique':len(normalizer.items)}
+    except (ValueError, csv.Error, zipfile.BadZipFile, KeyError) as e:
+        yield {'type':'error','error':f"Could not read the {file_format.upper()} file: {e}"}
+        return
+    finally:
+        stream.close()
+
+    inputs = normalizer.result()
+    if not inputs.items:
+        what = "subscription keys" if kind == "subscription" else "devices"
+        yield {'type':'error','error':f"No valid {what} found in the file.",**inputs.report()}
+        return
+
+    if kind == "subscription":
+        yield from subscriptionApp.subscription_events(inputs, parsed_headers, use_cache, mode)
+    else:
+        yield from deviceApp.lookup_events(inputs, lookup_type, parsed_headers, use_cache, mode)
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+@upload_bp.route("/api/upload-stream", methods=["POST"])
+def upload_stream():
+    """
+    Multipart lookup: `file` (.csv, .txt or .xlsx) plus form fields kind
+    (device|subscription), type (serial|mac), mode, encoding, refresh, column
+    and parsed_headers (JSON). Streams the same events as the JSON endpoints,
+    preceded by 'parsing' progress.
+    """
+    if request.content_length and request.content_length > UPLOAD_MAX_BYTES:
+        return jsonify({"error": f"File too large (limit {UPLOAD_MAX_BYTES // (1024 * 1024)} MB)."}), 413
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "No file uploaded."}), 400
+    file_format = FORMATS.get(os.path.splitext(upload.filename)[1].lower())
+    if not file_format:
+        return jsonify({"error": "Unsupported file type — upload a .csv, .txt or .xlsx file."}), 400
+
+    kind = request.form.get("kind", "device")
+    if kind not in ("device", "subscription"):
+        return jsonify({"error": f"Unknown kind: {kind}"}), 400
+    try:
+        parsed_headers = json.loads(request.form.get("parsed_headers") or "{}")
+    except ValueError:
+        return jsonify({"error": "parsed_headers must be a JSON object."}), 400
+
+    lookup_type = request.form.get("type", "serial")
+    use_cache   = request.form.get("refresh", "").lower() not in ("1", "true")
+    mode        = request.form.get("mode", "full")
+    column      = request.form.get("column") or None
+
+    # Werkzeug closes request files once the view returns, but parsing runs while the
+    # response streams, so the stream gets its own spooled copy (closed by upload_events)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    shutil.copyfileobj(upload.stream, spool)
+    spool.seek(0)
+    events = upload_events(spool, file_format, kind, lookup_type, parsed_headers, use_cache, mode, column)
+    if kind == "subscription":
+        events = encode_events(events, "subscriptions", subscriptionRecords.COLUMNS, subscriptionApp.DICT_COLUMNS,
+                               request.form.get("encoding"))
+    else:
+        events = encode_events(events, "devices", deviceRecords.COLUMNS, deviceApp.DICT_COLUMNS,
+                               request.form.get("encoding"))
+    return event_stream(events, f"upload-{kind}")
@@ -0,0 +1,162 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from rateLimiter import retry_after_seconds
+
+# ─── Config ───────────────────────────────────────────────────────────────────
+# Point at benchmarks/mock_upstream.py (e.g. http://127.0.0.1:8700) to run offline
+BASE_URL        = os.environ.get("UPSTREAM_BASE_URL", "https://aquila-user-api.common.cloud.hpe.com").rstrip("/")
+POOL_SIZE       = int(os.environ.get("UPSTREAM_POOL_SIZE", 32))
+CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT    = float(os.environ.get("UPSTREAM_READ_TIMEOUT", 10))
+MAX_ATTEMPTS    = int(os.environ.get("UPSTREAM_MAX_ATTEMPTS", 3))
+# Process-wide cap on requests in flight, shared by every stream and user
+MAX_IN_FLIGHT   = int(os.environ.get("UPSTREAM_MAX_IN_FLIGHT", 16))
+BACKOFF_BASE    = 0.25   # seconds; attempt n sleeps uniform(0, BACKOFF_BASE * 2**n)
+BACKOFF_CAP     = 8.0
+RETRY_STATUSES  = {429, 500, 502, 503, 504}
+
+_session      = None
+_session_lock = threading.Lock()
+
+
+class _FairSlots:
+    """
+    Counting semaphore that admits waiters in arrival order. A released slot
+    is handed straight to the oldest waiter, so a thread that frees a slot
+    and asks again goes to the back of the queue instead of re-taking it
+    while another stream's thread is still waking up.
+    """
+
+    def __init__(self, slots):
+        self._free    = slots
+        self._waiters = deque()
+        self._lock    = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return self
+            ready = threading.Event()
+            self._waiters.append(ready)
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self._free += 1
+
+
+_in_flight = _FairSlots(MAX_IN_FLIGHT)
+
+
+def get_session():
+    """
+    Process-wide keep-alive session shared by every blueprint and thread.
+    urllib3's pool is thread-safe; cookies are never stored because each
+    request carries the caller's own Cookie header and tenants must not mix.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _backoff(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+    return max(delay, retry_after or 0)
+
+
+def _finish(endpoint, attempts, in_http, waited):
+    metrics.UPSTREAM_WAIT.observe(waited, endpoint=endpoint)
+    metrics.record(upstream_calls=attempts, upstream_seconds=in_http, waited_seconds=waited, retries=attempts - 1)
+
+
+def get(url, headers=None, limiter=None, timeout=None, retry_statuses=RETRY_STATUSES):
+    """
+    GET through the pooled session with jittered-backoff retries on
+    connection errors and retry_statuses (429/5xx by default); any other
+    status is returned at once without throttling the limiter. The returned response carries a
+    ``timing`` dict: attempts, total seconds, and seconds spent waiting
+    on the limiter, the in-flight cap and backoff. Non-retryable errors are left to the caller's
+    raise_for_status(); connection errors re-raise after the last attempt.
+    Every attempt is recorded in metrics and in the active lookup's trace.
+    """
+    session  = get_session()
+    timeout  = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    endpoint = urlsplit(url).path.rsplit("/", 1)[-1]   # activate-devices / subscriptions
+    started  = time.monotonic()
+    waited   = 0.0
+    in_http  = 0.0
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if limiter is not None:
+            t0 = time.monotonic()
+            limiter.acquire()
+            waited += time.monotonic() - t0
+        try:
+            t0 = time.monotonic()
+            with _in_flight:
+                t1       = time.monotonic()
+                waited  += t1 - t0
+                try:
+                    response = session.get(url, headers=headers, timeout=timeout)
+                finally:
+                    spent    = time.monotonic() - t1
+                    in_http += spent
+                    metrics.UPSTREAM_SECONDS.observe(spent, endpoint=endpoint)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.UPSTREAM_RESPONSES.inc(endpoint=endpoint, status="error")
+            if limiter is not None:
+                limiter.on_throttle()
+            if attempt == MAX_ATTEMPTS:
+                _finish(endpoint, attempt, in_http, waited)
+                raise
+            delay = _backoff(attempt)
+            metrics.log("upstream_retry", endpoint=endpoint, attempt=attempt, error=type(e).__name__, delay=round(delay, 3))
+        else:
+            metrics.UPSTREAM_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+            if response.status_code not in retry_statuses:
+                if limiter is not None:
+                    limiter.on_success()
+                break
+            retry_after = retry_after_seconds(response)
+            if limiter is not None:
+                limiter.on_throttle(retry_after)
+            if attempt == MAX_ATTEMPTS:
+                break
+            response.close()
+            # The limiter already pauses for Retry-After; don't sleep it twice
+            delay = _backoff(attempt, None if limiter is not None else retry_after)
+            metrics.log("upstream_retry", endpoint=endpoint, attempt=attempt, status=response.status_code, delay=round(delay, 3))
+        metrics.UPSTREAM_RETRIES.inc(endpoint=endpoint)
+        time.sleep(delay)
+        waited += delay
+
+    _finish(endpoint, attempt, in_http, waited)
+    response.timing = {
+        "attempts": attempt,
+        "elapsed":  round(time.monotonic() - started, 4),
+        "waited":   round(waited, 4),
+    }
+    return response
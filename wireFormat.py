@@ -0,0 +1,76 @@
+class ColumnarEncoder:
+    """
+    Opt-in compact encoding for the row lists in stream events
+    (`"encoding": "columnar"` in the request body).
+
+    Instead of one dict per row, rows become arrays in `columns` order. The
+    column list is sent once, on the first encoded event. Cells in
+    `dict_columns` (folder names, workspaces, types...) are sent as indexes
+    into per-column dictionaries. Each event carries only the values its
+    rows added to those dictionaries, under `dict`; the client appends them.
+
+    One encoder per stream, because the dictionaries build up across events.
+    """
+
+    def __init__(self, columns, dict_columns=()):
+        self.columns      = list(columns)
+        self.dict_columns = [c for c in self.columns if c in dict_columns]
+        self._lookups     = {c: {} for c in self.dict_columns}
+        self._sent_header = False
+
+    def encode(self, rows):
+        """Returns (array rows, {column: newly added dictionary values})."""
+        columns, lookups = self.columns, self._lookups
+        added, out = {}, []
+        for row in rows:
+            cells = [row.get(c, "") for c in columns]
+            for i, col in enumerate(columns):
+                lookup = lookups.get(col)
+                if lookup is None:
+                    continue
+                value = cells[i]
+                index = lookup.get(value)
+                if index is None:
+                    index = lookup[value] = len(lookup)
+                    added.setdefault(col, []).append(value)
+                cells[i] = index
+            out.append(cells)
+        return out, added
+
+    def encode_into(self, container, key):
+        """Replace container[key]'s row dicts in place and attach the header/dictionary fields."""
+        rows, added = self.encode(container.get(key) or [])
+        container[key]        = rows
+        container["encoding"] = "columnar"
+        if not self._sent_header:
+            container["columns"]      = self.columns
+            container["dict_columns"] = self.dict_columns
+            self._sent_header         = True
+        if added:
+            container["dict"] = added
+        return container
+
+
+def columnar_events(events, key, columns, dict_columns=()):
+    """
+    Encode the `key` row lists ('devices' or 'subscriptions') of rows events
+    and of a full-mode done event; every other event passes through as-is.
+    """
+    encoder = ColumnarEncoder(columns, dict_columns)
+    for ev in events:
+        if ev["type"] == "rows":
+            encoder.encode_into(ev, key)
+        elif ev["type"] == "done" and key in ev.get("data", {}):
+            encoder.encode_into(ev["data"], key)
+        yield ev
+
+
+def encode_events(events, key, columns, dict_columns, encoding):
+    """
+    Apply the requested row encoding to a blueprint's event stream; only
+    "columnar" changes anything. dict_columns are the low-cardinality columns
+    sent as dictionary indexes.
+    """
+    if encoding == "columnar":
+        return columnar_events(events, key, columns, dict_columns)
+    return events